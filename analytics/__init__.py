@@ -0,0 +1,3 @@
+"""
+Shared data layer for the customer analytics dashboards and notebook.
+"""
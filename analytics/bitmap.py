@@ -0,0 +1,301 @@
+"""
+Bitmap and sorted indexes for filtering customers.
+
+Each value of a low-cardinality column (segment, CLV tier, cluster) gets a
+bitmap with one bit per customer, packed eight customers to a byte. A
+filter ORs the bitmaps of the selected values of each column and ANDs the
+columns together, touching n / 8 bytes per bitmap instead of comparing
+every row. Range predicates on a numeric column use its sorted order: the
+matching customers are one contiguous run of it, found by binary search.
+The run is assembled from prefix bitmaps kept every 1/RANGE_BLOCKS of the
+order (customers ranked below each block boundary), taken between the
+block boundaries nearest to the run's ends and corrected by setting or
+clearing the customers in between, so a range costs a bitmap AND-NOT plus
+at most one block of bit writes.
+
+The match count is a popcount of the result, so a filter is answered
+without materializing any rows; rows() unpacks the positions only when
+they are actually needed. A page of matches ranked by a sorted column
+comes from ordered_rows(), which walks that column's order and stops as
+soon as the page is filled.
+"""
+
+import numpy as np
+import pandas as pd
+
+from analytics.dataset import COLUMN_ALIASES
+from analytics.export import CHUNK_ROWS, frame_chunks
+from analytics.paging import top_k
+
+BITMAP_COLUMNS = ['Customer_Segment', 'Cluster_Name', 'Cluster', 'CLV_Segment']
+SORTED_COLUMNS = ['CLV_Predictive']
+
+# Prefix bitmaps per sorted column (memory: RANGE_BLOCKS + 1 bitmaps of n / 8 bytes)
+RANGE_BLOCKS = 64
+
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype='uint8')
+
+
+def set_bits(bitmap, positions):
+    """Set the bits of the given row positions in a packed bitmap, in place"""
+    positions = np.asarray(positions, dtype='int64')
+    np.bitwise_or.at(bitmap, positions >> 3, np.uint8(128) >> (positions & 7).astype('uint8'))
+
+
+def clear_bits(bitmap, positions):
+    """Clear the bits of the given row positions in a packed bitmap, in place"""
+    positions = np.asarray(positions, dtype='int64')
+    np.bitwise_and.at(bitmap, positions >> 3, ~(np.uint8(128) >> (positions & 7).astype('uint8')))
+
+
+def popcount(bitmap):
+    """Number of set bits in a packed bitmap"""
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(bitmap).sum(dtype='int64'))
+    return int(_POPCOUNT[bitmap].sum(dtype='int64'))
+
+
+class BitmapIndex:
+    """Packed bitmaps per column value and sorted orders of numeric columns"""
+
+    def __init__(self, df, bitmap_columns, sorted_columns, range_blocks=RANGE_BLOCKS):
+        self.n = len(df)
+        self._bitmaps = {}
+        self._values = {}
+        self._missing = {}
+        for column in bitmap_columns:
+            codes, uniques = pd.factorize(df[column], sort=True)
+            self._bitmaps[column] = {value: np.packbits(codes == code) for code, value in enumerate(uniques)}
+            self._values[column] = list(uniques)
+            self._missing[column] = bool((codes < 0).any())
+
+        self._all = np.packbits(np.ones(self.n, dtype=bool))
+        self._block = max(-(-self.n // range_blocks), 1)
+        self._order = {}
+        self._sorted = {}
+        self._prefixes = {}
+        for column in sorted_columns:
+            values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+            order = np.argsort(values, kind='stable')
+            self._order[column] = order
+            self._sorted[column] = values[order]
+
+            # prefixes[j]: customers ranked below j * block in the sorted order
+            prefixes = [np.zeros_like(self._all)]
+            for start in range(0, self.n, self._block):
+                prefix = prefixes[-1].copy()
+                set_bits(prefix, order[start:start + self._block])
+                prefixes.append(prefix)
+            self._prefixes[column] = prefixes
+
+    @classmethod
+    def from_dataset(cls, data):
+        """Index a CustomerDataset, loading only the indexed columns"""
+        bitmap_columns = [column for column in BITMAP_COLUMNS if column in data.available]
+        sorted_columns = [column for column in SORTED_COLUMNS if column in data.available]
+        return cls(data.frame(bitmap_columns + sorted_columns), bitmap_columns, sorted_columns)
+
+    @staticmethod
+    def resolve(column):
+        return COLUMN_ALIASES.get(column, column)
+
+    def values(self, column):
+        """Indexed values of a column, in sorted order"""
+        return list(self._values[self.resolve(column)])
+
+    def bounds(self, column):
+        """(min, max) of a sorted column, ignoring missing values"""
+        sorted_values = self._sorted[self.resolve(column)]
+        finite = sorted_values[:np.searchsorted(sorted_values, np.inf, side='right')]
+        if not len(finite):
+            return 0.0, 0.0
+        return float(finite[0]), float(finite[-1])
+
+    def any_of(self, column, values):
+        """Bitmap of the customers whose column is one of values"""
+        column = self.resolve(column)
+        bitmaps = self._bitmaps[column]
+        values = set(values)
+        selected = [bitmap for value, bitmap in bitmaps.items() if value in values]
+        if not selected:
+            return np.zeros_like(self._all)
+
+        # Without missing values the bitmaps partition the customers:
+        # OR the smaller side and negate it when that is the unselected one
+        others = [bitmap for value, bitmap in bitmaps.items() if value not in values]
+        negate = len(others) < len(selected) and not self._missing[column]
+        if negate and not others:
+            return self._all
+        side = others if negate else selected
+        result = side[0].copy()
+        for bitmap in side[1:]:
+            result |= bitmap
+        if negate:
+            np.bitwise_and(self._all, ~result, out=result)
+        return result
+
+    def between(self, column, low=None, high=None):
+        """Bitmap of the customers with low <= column <= high (None: unbounded)"""
+        column = self.resolve(column)
+        sorted_values = self._sorted[column]
+        start = 0 if low is None else int(np.searchsorted(sorted_values, low, side='left'))
+        end = int(np.searchsorted(sorted_values, np.inf if high is None else high, side='right'))
+        if start >= end:
+            return np.zeros_like(self._all)
+
+        # Blocks between the nearest boundaries, then fix up the ends of the run
+        order = self._order[column]
+        prefixes = self._prefixes[column]
+        block = self._block
+        first, last = round(start / block), min(round(end / block), len(prefixes) - 1)
+        if first >= last:
+            bitmap = np.zeros_like(self._all)
+            set_bits(bitmap, order[start:end])
+            return bitmap
+
+        bitmap = prefixes[last] & ~prefixes[first]
+        if start < first * block:
+            set_bits(bitmap, order[start:first * block])
+        else:
+            clear_bits(bitmap, order[first * block:start])
+        if end > last * block:
+            set_bits(bitmap, order[last * block:end])
+        else:
+            clear_bits(bitmap, order[end:last * block])
+        return bitmap
+
+    def query(self, filters=None, ranges=None):
+        """
+        Bitmap of the customers matching every filter and range
+
+        Parameters:
+        filters: {column: allowed values}; values are ORed, columns ANDed
+        ranges: {column: (low, high)} on sorted columns
+        """
+        result = self._all.copy()
+        for column, values in (filters or {}).items():
+            result &= self.any_of(column, values)
+        for column, (low, high) in (ranges or {}).items():
+            result &= self.between(column, low, high)
+        return result
+
+    def has_order(self, column):
+        return self.resolve(column) in self._order
+
+    def ordered_rows(self, bitmap, column, start, stop, ascending=False, low=None, high=None):
+        """
+        Row positions of the customers ranked start..stop in a bitmap by a sorted column
+
+        Scans the column's order in growing chunks, sized from the match
+        rate, so an early page of a large result reads only a short prefix.
+        Missing values rank last in both directions.
+
+        Parameters:
+        low, high: range the bitmap is already restricted to on this column,
+                   so the scan can skip the ranks outside it
+        """
+        column = self.resolve(column)
+        order = self._order[column]
+        sorted_values = self._sorted[column]
+        n_valid = int(np.searchsorted(sorted_values, np.nan, side='left'))
+        if low is None and high is None:
+            valid, missing = order[:n_valid], order[n_valid:]
+        else:
+            first = 0 if low is None else int(np.searchsorted(sorted_values, low, side='left'))
+            last = int(np.searchsorted(sorted_values, np.inf if high is None else high, side='right'))
+            valid, missing = order[first:last], order[:0]
+        if not ascending:
+            valid = valid[::-1]
+
+        def ranked(low, high):
+            skip = len(valid)
+            return np.concatenate([valid[low:high], missing[max(low - skip, 0):max(high - skip, 0)]])
+
+        total = popcount(bitmap)
+        stop = min(stop, total)
+        if start >= stop:
+            return np.empty(0, dtype='int64')
+
+        span = len(valid) + len(missing)
+        found = []
+        matched = position = 0
+        chunk = max(2 * stop * span // total, 4096)
+        while matched < stop and position < span:
+            candidates = ranked(position, position + chunk)
+            hits = candidates[(bitmap[candidates >> 3] >> (7 - (candidates & 7))) & 1 == 1]
+            found.append(hits)
+            matched += len(hits)
+            position += chunk
+            chunk *= 2
+        return np.concatenate(found)[start:stop]
+
+    def count(self, bitmap):
+        """Number of customers in a bitmap"""
+        return popcount(bitmap)
+
+    def rows(self, bitmap):
+        """Row positions of the customers in a bitmap, ascending"""
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.n))
+
+
+class BitmapSearch:
+    """
+    Explorer queries answered from a BitmapIndex and the loaded columns
+
+    The in-memory counterpart of analytics.database.CustomerDatabase: the
+    same methods, for data published without the database.
+    """
+
+    def __init__(self, index, data):
+        self.index = index
+        self.data = data
+
+    @property
+    def columns(self):
+        return self.data.available
+
+    def values(self, column):
+        return self.index.values(column)
+
+    def bounds(self, column):
+        return self.index.bounds(column)
+
+    def count(self, filters=None, ranges=None):
+        """Number of customers matching every filter and range"""
+        return self.index.count(self.index.query(filters, ranges))
+
+    def ordered_rows(self, filters, ranges, sort_column, ascending, start, stop):
+        """
+        Row positions of the matches ranked start..stop
+
+        Walks the index's sorted order when it has one for the sort column,
+        else makes a partial selection on the column's values.
+        """
+        bitmap = self.index.query(filters, ranges)
+        if self.index.has_order(sort_column):
+            low, high = (ranges or {}).get(sort_column, (None, None))
+            return self.index.ordered_rows(bitmap, sort_column, start, stop, ascending, low=low, high=high)
+
+        rows = self.index.rows(bitmap)
+        values = self.data.frame([sort_column])[sort_column].to_numpy(dtype='float64', na_value=np.nan)[rows]
+        return rows[top_k(values, stop, ascending)[start:]]
+
+    def page(self, columns, filters=None, ranges=None, sort_column='CLV_Predictive', ascending=False,
+             start=0, stop=None):
+        """Customers ranked start..stop among the matches, as a DataFrame"""
+        stop = self.index.n if stop is None else stop
+        rows = self.ordered_rows(filters, ranges, sort_column, ascending, start, stop)
+        return self.data.frame(columns).iloc[rows]
+
+    def chunks(self, columns, filters=None, ranges=None, sort_column='CLV_Predictive', ascending=False,
+               chunk_rows=CHUNK_ROWS):
+        """Every matching customer in result order, chunk_rows at a time (for exports)"""
+        rows = self.ordered_rows(filters, ranges, sort_column, ascending, 0, self.index.n)
+        return frame_chunks(self.data.frame(columns), rows, chunk_rows)
+
+    def cube_cells(self, dimensions, measures, filters=None, ranges=None):
+        """Cells of the aggregate cube over the customers matching a selection"""
+        from analytics.cube import AggregateCube
+
+        rows = self.index.rows(self.index.query(filters, ranges))
+        return AggregateCube.build(self.data.frame(dimensions + measures).iloc[rows]).cells
@@ -0,0 +1,133 @@
+"""
+Charts whose payload does not grow with the number of customers.
+
+Histograms are binned server-side (compute_histogram) and sent as bars,
+so their figure holds one value per bin.
+
+A Plotly scatter sends every point to the browser, so a few hundred
+thousand customers already freeze the page. adaptive_scatter picks one of
+three renderings from the number of points:
+
+- up to the point budget, every customer, drawn with WebGL;
+- above it, a sample of about the budget, stratified by the color column
+  so small groups keep their share (and at least a few points);
+- when even the sample would show under DENSITY_MIN_FRACTION of the
+  customers, a 2D density: counts binned server-side with NumPy and sent
+  as a heatmap of DENSITY_BINS x DENSITY_BINS cells.
+
+The figure JSON is therefore bounded by the budget (or the bin grid),
+whatever the customer count.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from analytics.sampling import stratified_sample
+
+WEBGL_POINT_BUDGET = 50_000
+DENSITY_MIN_FRACTION = 0.05
+DENSITY_BINS = 200
+
+# Bin edges and counts of one column, with the mean of the binned values
+Histogram = namedtuple('Histogram', ['edges', 'counts', 'mean', 'count'])
+
+
+def compute_histogram(values, bins=30, range=None):
+    """
+    Bin a column with NumPy in one pass, skipping missing values
+
+    Parameters:
+    bins: number of equal-width bins
+    range: (low, high) of the bins (default: the data's min and max)
+    """
+    values = np.asarray(values, dtype='float64')
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins, range=range)
+    mean = float(values.mean()) if len(values) else float('nan')
+    return Histogram(edges, counts, mean, int(len(values)))
+
+
+def histogram_bar(histogram, **bar_args):
+    """Bar trace drawing a pre-binned histogram (bars span their bins)"""
+    edges = histogram.edges
+    return go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=histogram.counts, width=np.diff(edges), **bar_args)
+
+
+def histogram_figure(histogram, title=None, x_title=None, color=None, mean_label=None):
+    """
+    px.histogram look-alike for a pre-binned histogram
+
+    Parameters:
+    mean_label: format of the annotation on a dashed line at the mean
+                (e.g. "Mean: ${:,.0f}"); no line when None
+    """
+    fig = go.Figure(histogram_bar(histogram, marker_color=color))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title='count', bargap=0)
+    if mean_label and histogram.count:
+        fig.add_vline(x=histogram.mean, line_dash="dash", line_color="red",
+                      annotation_text=mean_label.format(histogram.mean))
+    return fig
+
+
+def density_figure(df, x, y, bins=DENSITY_BINS, title=None, labels=None):
+    """Heatmap of customer counts on a bins x bins grid (log-scaled colors)"""
+    labels = labels or {}
+    values_x = df[x].to_numpy(dtype='float64')
+    values_y = df[y].to_numpy(dtype='float64')
+    finite = np.isfinite(values_x) & np.isfinite(values_y)
+    counts, edges_x, edges_y = np.histogram2d(values_x[finite], values_y[finite], bins=bins)
+
+    # Empty cells are left blank; log10 keeps sparse regions visible
+    with np.errstate(divide='ignore'):
+        z = np.where(counts > 0, np.log10(counts), np.nan).T
+    fig = go.Figure(go.Heatmap(
+        x=(edges_x[:-1] + edges_x[1:]) / 2,
+        y=(edges_y[:-1] + edges_y[1:]) / 2,
+        z=z,
+        customdata=counts.T,
+        colorscale='Viridis',
+        colorbar=dict(title='Customers', tickvals=[0, 1, 2, 3, 4, 5, 6],
+                      ticktext=['1', '10', '100', '1K', '10K', '100K', '1M']),
+        hovertemplate=f"{labels.get(x, x)}: %{{x:,.0f}}<br>{labels.get(y, y)}: %{{y:,.0f}}"
+                      "<br>Customers: %{customdata:,.0f}<extra></extra>"
+    ))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
+
+
+def adaptive_scatter(df, x, y, color, budget=WEBGL_POINT_BUDGET, **scatter_args):
+    """
+    px.scatter with a bounded payload
+
+    Parameters:
+    color: column that colors the points (and stratifies the sample)
+    budget: most points sent to the browser
+    scatter_args: passed on to px.scatter (size, hover_data, title, ...)
+
+    Returns:
+    (figure, note): note describes the sample or density shown, None when
+    every customer is drawn
+    """
+    n = len(df)
+    if n > budget and budget / n < DENSITY_MIN_FRACTION:
+        fig = density_figure(df, x, y, title=scatter_args.get('title'), labels=scatter_args.get('labels'))
+        return fig, f"Density of all {n:,} customers (too many to draw individually)"
+
+    # Keep colors stable whether or not the frame is sampled
+    category_orders = dict(scatter_args.pop('category_orders', None) or {})
+    category_orders.setdefault(color, list(pd.unique(df[color].dropna())))
+
+    note = None
+    if n > budget:
+        codes, _ = pd.factorize(df[color])
+        rows = np.sort(stratified_sample(codes, budget, np.random.default_rng(42)))
+        df = df.iloc[rows]
+        note = f"Showing a sample of {len(df):,} of {n:,} customers, stratified by {color}"
+
+    fig = px.scatter(df, x=x, y=y, color=color, category_orders=category_orders,
+                     render_mode='webgl', **scatter_args)
+    return fig, note
@@ -0,0 +1,172 @@
+"""
+Choice of the number of K-Means clusters.
+
+Every candidate k is evaluated in a process pool. Each worker fits K-Means
+on all customers, which gives the inertia for the elbow curve. It then
+scores the silhouette on several samples drawn stratified by cluster,
+because the exact silhouette needs all pairwise distances (O(n^2)). The
+spread of the sample scores gives a confidence interval for each k.
+
+The chosen k is the smallest one whose silhouette interval overlaps the
+interval of the best-scoring k: fewer clusters unless more are clearly
+better. The result, with a timing breakdown, is saved next to the
+dashboard data so the dashboard can show why k was chosen.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from analytics.clustering import BATCH_ROWS, CLUSTER_FEATURES
+from analytics.sampling import stratified_sample
+
+SELECTION_FILE = 'cluster_selection.json'
+
+DEFAULT_K_VALUES = range(2, 9)
+DEFAULT_SAMPLE_SIZE = 5_000
+DEFAULT_SAMPLES = 10
+
+# Standardized features shared with the workers once, by the pool initializer
+_features = None
+
+
+def _init_worker(features):
+    global _features
+    _features = features
+
+
+def _evaluate_k(k, sample_size, n_samples, random_state):
+    """Inertia on all rows and silhouette scores on stratified samples for one k"""
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+
+    features = _features
+
+    start = time.perf_counter()
+    if len(features) <= BATCH_ROWS:
+        kmeans = KMeans(n_clusters=k, n_init=10, random_state=random_state).fit(features)
+    else:
+        kmeans = MiniBatchKMeans(n_clusters=k, n_init=3, batch_size=BATCH_ROWS // 10,
+                                 random_state=random_state).fit(features)
+    labels = kmeans.predict(features)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rng = np.random.default_rng([random_state, k])
+    scores = []
+    for _ in range(n_samples):
+        rows = stratified_sample(labels, sample_size, rng)
+        scores.append(float(silhouette_score(features[rows], labels[rows])))
+    silhouette_seconds = time.perf_counter() - start
+
+    return {
+        'k': int(k),
+        'inertia': float(kmeans.inertia_),
+        'silhouette_scores': scores,
+        'fit_seconds': fit_seconds,
+        'silhouette_seconds': silhouette_seconds,
+    }
+
+
+def confidence_interval(scores, level=0.95):
+    """Mean and Student-t confidence interval of repeated sample scores"""
+    from scipy import stats
+
+    scores = np.asarray(scores, dtype='float64')
+    mean = float(scores.mean())
+    if len(scores) < 2:
+        return mean, mean, mean
+    half_width = stats.t.ppf((1 + level) / 2, len(scores) - 1) * scores.std(ddof=1) / np.sqrt(len(scores))
+    return mean, float(mean - half_width), float(mean + half_width)
+
+
+def elbow_k(k_values, inertias):
+    """k at the elbow: the point farthest from the line joining the ends of the curve"""
+    k_values = np.asarray(k_values, dtype='float64')
+    inertias = np.asarray(inertias, dtype='float64')
+    if len(k_values) < 3:
+        return int(k_values[0])
+
+    # Normalize both axes so the distance does not depend on their units
+    x = (k_values - k_values[0]) / (k_values[-1] - k_values[0])
+    y = (inertias - inertias[-1]) / max(inertias[0] - inertias[-1], 1e-12)
+    distance = np.abs(x + y - 1) / np.sqrt(2)
+    return int(k_values[distance.argmax()])
+
+
+def select_cluster_count(df, k_values=DEFAULT_K_VALUES, workers=None, sample_size=DEFAULT_SAMPLE_SIZE,
+                         n_samples=DEFAULT_SAMPLES, random_state=42):
+    """
+    Evaluate each k in parallel and choose the number of clusters
+
+    Parameters:
+    df: customer frame with Recency, Frequency and Monetary
+    workers: number of processes (default: all cores, at most one per k)
+    sample_size: rows in each silhouette sample
+    n_samples: silhouette samples per k
+
+    Returns:
+    Dictionary with the chosen k, the elbow k, per-k results (inertia,
+    silhouette mean and 95% interval, timings) and the total timings
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    k_values = [int(k) for k in k_values]
+    workers = min(workers or os.cpu_count() or 1, len(k_values))
+    wall_start = time.perf_counter()
+
+    start = time.perf_counter()
+    features = StandardScaler().fit_transform(df[CLUSTER_FEATURES].to_numpy(dtype='float64'))
+    scale_seconds = time.perf_counter() - start
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(features,)) as pool:
+        results = list(pool.map(_evaluate_k, k_values, [sample_size] * len(k_values),
+                                [n_samples] * len(k_values), [random_state] * len(k_values)))
+
+    for result in results:
+        mean, low, high = confidence_interval(result['silhouette_scores'])
+        result.update(silhouette=mean, silhouette_low=low, silhouette_high=high)
+
+    best = max(results, key=lambda result: result['silhouette'])
+    chosen = min(result['k'] for result in results if result['silhouette_high'] >= best['silhouette_low'])
+
+    return {
+        'chosen_k': chosen,
+        'best_silhouette_k': best['k'],
+        'elbow_k': elbow_k(k_values, [result['inertia'] for result in results]),
+        'customers': int(len(df)),
+        'sample_size': int(sample_size),
+        'n_samples': int(n_samples),
+        'results': results,
+        'timings': {
+            'workers': workers,
+            'scale_seconds': scale_seconds,
+            'fit_seconds': sum(result['fit_seconds'] for result in results),
+            'silhouette_seconds': sum(result['silhouette_seconds'] for result in results),
+            'wall_seconds': time.perf_counter() - wall_start,
+        },
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def save_cluster_selection(selection, data_dir):
+    """Write the selection next to the dashboard data"""
+    path = Path(data_dir) / SELECTION_FILE
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(selection, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_cluster_selection(data_dir):
+    """The saved selection, or None if k was not selected for this data"""
+    path = Path(data_dir) / SELECTION_FILE
+    if not path.exists():
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,164 @@
+"""
+Streaming K-Means clustering of customers on Recency, Frequency and Monetary.
+
+Features are standardized with statistics gathered in a first pass over
+row batches, then clustered with mini-batch K-Means fed one batch at a
+time, so memory depends on the batch size rather than on the number of
+customers. Data that fits in a single batch is clustered with full K-Means
+instead, which gives the same result as fitting in memory.
+
+A fit can warm-start from a previous model's centroids. Clusters are then
+ordered by a value score of their centroid (recent, frequent, high spend
+first), and both the cluster ids and the names follow that order. The
+same kind of customers therefore keeps the same Cluster and Cluster_Name
+from run to run, whatever order K-Means finds the centroids in.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CLUSTER_FEATURES = ['Recency', 'Frequency', 'Monetary']
+CLUSTER_MODEL_FILE = 'cluster_model.json'
+BATCH_ROWS = 100_000
+
+# Cluster names from the most to the least valuable centroid
+CLUSTER_NAMES_BY_VALUE = ['VIP Customers', 'Regular Customers', 'Occasional Customers', 'At-Risk Customers']
+
+# Direction of each standardized feature in the value score
+VALUE_WEIGHTS = {'Recency': -1.0, 'Frequency': 1.0, 'Monetary': 1.0}
+
+
+def feature_batches(source, batch_rows=BATCH_ROWS):
+    """
+    Float feature matrices of at most batch_rows rows
+
+    Parameters:
+    source: DataFrame, or a function returning a fresh iterable of
+            DataFrames (called once per pass over the data)
+    """
+    frames = [source] if isinstance(source, pd.DataFrame) else source()
+    for frame in frames:
+        features = frame[CLUSTER_FEATURES]
+        for start in range(0, len(features), batch_rows):
+            yield features.iloc[start:start + batch_rows].to_numpy(dtype='float64')
+
+
+def cluster_names(n_clusters):
+    """Names for clusters ordered from the most to the least valuable"""
+    if n_clusters <= len(CLUSTER_NAMES_BY_VALUE):
+        # Spread fewer clusters over the named tiers, keeping both ends
+        tiers = np.linspace(0, len(CLUSTER_NAMES_BY_VALUE) - 1, n_clusters).round().astype(int)
+        return [CLUSTER_NAMES_BY_VALUE[tier] for tier in tiers]
+    return [f"Value Tier {rank + 1}" for rank in range(n_clusters)]
+
+
+class ClusterModel:
+    """Feature scaling, centroids and names of a fitted clustering"""
+
+    def __init__(self, mean, scale, centroids, names):
+        self.mean = np.asarray(mean, dtype='float64')
+        self.scale = np.asarray(scale, dtype='float64')
+        self.centroids = np.asarray(centroids, dtype='float64')
+        self.names = list(names)
+
+    @property
+    def n_clusters(self):
+        return len(self.centroids)
+
+    def transform(self, features):
+        return (features - self.mean) / self.scale
+
+    def predict(self, source, batch_rows=BATCH_ROWS):
+        """Cluster id of every customer, computed batch by batch"""
+        labels = []
+        for features in feature_batches(source, batch_rows):
+            scaled = self.transform(features)
+            distances = ((scaled[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+            labels.append(distances.argmin(axis=1).astype('int8'))
+        return np.concatenate(labels) if labels else np.empty(0, dtype='int8')
+
+    def centroid_frame(self):
+        """Centroids in original units, indexed by cluster id"""
+        centroids = self.centroids * self.scale + self.mean
+        return pd.DataFrame(centroids, columns=CLUSTER_FEATURES).rename_axis('Cluster')
+
+    def to_dict(self):
+        return {
+            'features': CLUSTER_FEATURES,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'centroids': self.centroids.tolist(),
+            'names': self.names,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['mean'], data['scale'], data['centroids'], data['names'])
+
+    def save(self, path):
+        """Write the model as JSON (via a temporary file and a rename)"""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+
+def load_cluster_model(data_dir):
+    """The model saved in a data directory, or None if there is none"""
+    path = Path(data_dir) / CLUSTER_MODEL_FILE
+    return ClusterModel.load(path) if path.exists() else None
+
+
+def fit_clusters(source, n_clusters=4, warm_start=None, epochs=3, batch_rows=BATCH_ROWS,
+                 random_state=42):
+    """
+    Fit K-Means on the customers' standardized Recency, Frequency and Monetary
+
+    Parameters:
+    source: DataFrame, or a function returning a fresh iterable of DataFrames
+    warm_start: previous ClusterModel whose centroids seed the fit
+    epochs: passes of mini-batch K-Means over the data when it does not fit
+            in one batch
+
+    Returns:
+    ClusterModel with clusters ordered (and named) by value
+    """
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+    from sklearn.preprocessing import StandardScaler
+
+    # Pass 1: feature means and standard deviations
+    scaler = StandardScaler()
+    for features in feature_batches(source, batch_rows):
+        scaler.partial_fit(features)
+
+    init = 'k-means++'
+    if warm_start is not None and warm_start.n_clusters == n_clusters:
+        init = scaler.transform(warm_start.centroid_frame().to_numpy())
+
+    if scaler.n_samples_seen_ <= batch_rows:
+        features = scaler.transform(next(feature_batches(source, batch_rows)))
+        kmeans = KMeans(n_clusters=n_clusters, init=init, n_init=10 if isinstance(init, str) else 1,
+                        random_state=random_state).fit(features)
+    else:
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, init=init, n_init=1,
+                                 batch_size=batch_rows, random_state=random_state)
+        for _ in range(epochs):
+            for features in feature_batches(source, batch_rows):
+                kmeans.partial_fit(scaler.transform(features))
+
+    # Order clusters by value so ids and names are stable across runs
+    centroids = kmeans.cluster_centers_
+    weights = np.array([VALUE_WEIGHTS[feature] for feature in CLUSTER_FEATURES])
+    order = np.argsort(-(centroids @ weights), kind='stable')
+
+    return ClusterModel(scaler.mean_, scaler.scale_, centroids[order], cluster_names(n_clusters))
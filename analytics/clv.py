@@ -0,0 +1,262 @@
+"""
+Probabilistic Customer Lifetime Value: BG/NBD + Gamma-Gamma.
+
+The BG/NBD model (Fader, Hardie & Lee, 2005) predicts how many purchases
+each customer will make from their repeat purchases, the age of their last
+purchase and their own age. The Gamma-Gamma model predicts the value of
+those purchases from each repeat customer's average order value. The two
+together give CLV_Predictive: the discounted value of the purchases
+expected over the next months. The formulas and parameterization are those
+of the lifetimes package, which also scores these models.
+
+Both models are fitted by maximum likelihood with scipy on a sample of the
+customers. BG/NBD only depends on (repeat purchases, recency, age) in
+whole days, so customers are compressed into distinct triples, each
+weighted by its count; scoring also runs once per distinct triple, which
+are far fewer than the customers. The distinct triples are split into
+chunks over a process pool, and the per-customer order value is a
+vectorized expression on top.
+
+Inputs follow RFM_COLUMNS, all in days: Frequency counts invoices
+(repeat purchases are Frequency - 1), Days_Since_First is the customer's
+age and Days_Since_First - Recency is the time from the first to the last
+purchase. The order value is Monetary / Frequency (every order, as the
+transaction-level split is not kept).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analytics.schema import CLV_SEGMENTS
+
+DAYS_PER_MONTH = 30
+DEFAULT_MONTHS = 12
+DEFAULT_DISCOUNT_RATE = 0.01  # monthly
+FIT_SAMPLE = 100_000
+CHUNK_ROWS = 250_000
+
+# Ridge penalty on the log-parameters; keeps them finite when the data
+# shows (almost) no dropout, where the unpenalized optimum has a -> 0, b -> inf
+DEFAULT_PENALIZER = 0.001
+
+# Lower CLV_Predictive quantile of each tier, from Diamond down to Silver;
+# the rest are Bronze
+CLV_TIER_QUANTILES = [0.90, 0.75, 0.50, 0.25]
+
+
+def clv_inputs(df):
+    """
+    Repeat purchases, recency and age (days) and order value of each customer
+
+    Returns:
+    Tuple of float64 arrays (x, t_x, T, m)
+    """
+    frequency = df['Frequency'].to_numpy(dtype='float64')
+    age = df['Days_Since_First'].to_numpy(dtype='float64')
+    x = frequency - 1
+    t_x = age - df['Recency'].to_numpy(dtype='float64')
+    m = df['Monetary'].to_numpy(dtype='float64') / np.maximum(frequency, 1)
+    return x, t_x, age, m
+
+
+def compress_histories(x, t_x, T):
+    """
+    Distinct (x, t_x, T) triples of whole-day histories
+
+    Returns:
+    (codes, triples, counts): codes map each customer to its triple
+    """
+    keys = (x.astype('int64') << 40) | (t_x.astype('int64') << 20) | T.astype('int64')
+    codes, uniques = pd.factorize(keys)
+    triples = np.column_stack([uniques >> 40, (uniques >> 20) & 0xFFFFF, uniques & 0xFFFFF]).astype('float64')
+    counts = np.bincount(codes, minlength=len(uniques))
+    return codes, triples, counts
+
+
+def bgnbd_log_likelihood(params, x, t_x, T):
+    """Log-likelihood of each customer history under BG/NBD"""
+    from scipy.special import betaln, gammaln
+
+    r, alpha, a, b = params
+    a1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+    a2 = betaln(a, b + x) - betaln(a, b)
+    a3 = -(r + x) * np.log(alpha + T)
+    a4 = np.log(a) - np.log(b + np.maximum(x, 1) - 1) - (r + x) * np.log(alpha + t_x)
+    return a1 + a2 + np.where(x > 0, np.logaddexp(a3, a4), a3)
+
+
+def gamma_gamma_log_likelihood(params, x, m):
+    """Log-likelihood of each repeat customer's order value under Gamma-Gamma"""
+    from scipy.special import gammaln
+
+    p, q, v = params
+    return (gammaln(p * x + q) - gammaln(p * x) - gammaln(q) + q * np.log(v)
+            + (p * x - 1) * np.log(m) + p * x * np.log(x) - (p * x + q) * np.log(x * m + v))
+
+
+def _fit(log_likelihood, n_params, weights, penalizer, *data):
+    """Maximize a weighted, penalized log-likelihood over positive parameters"""
+    from scipy.optimize import minimize
+
+    total = weights.sum()
+
+    def objective(log_params):
+        penalty = penalizer * (log_params ** 2).sum()
+        return -(weights * log_likelihood(np.exp(log_params), *data)).sum() / total + penalty
+
+    result = minimize(objective, np.zeros(n_params), method='L-BFGS-B')
+    return np.exp(result.x)
+
+
+def _sample(rows, sample, random_state):
+    if len(rows) <= sample:
+        return rows
+    return np.sort(np.random.default_rng(random_state).choice(rows, size=sample, replace=False))
+
+
+def fit_bgnbd(x, t_x, T, penalizer=DEFAULT_PENALIZER, sample=FIT_SAMPLE, random_state=42):
+    """
+    Fit BG/NBD on the distinct histories of (a sample of) the customers
+
+    Returns:
+    Dictionary with r, alpha, a, b
+    """
+    rows = _sample(np.arange(len(x)), sample, random_state)
+    _, triples, counts = compress_histories(x[rows], t_x[rows], T[rows])
+    r, alpha, a, b = _fit(bgnbd_log_likelihood, 4, counts.astype('float64'), penalizer, *triples.T)
+    return {'r': r, 'alpha': alpha, 'a': a, 'b': b}
+
+
+def fit_gamma_gamma(x, m, penalizer=DEFAULT_PENALIZER, sample=FIT_SAMPLE, random_state=42):
+    """
+    Fit Gamma-Gamma on (a sample of) the repeat customers
+
+    Returns:
+    Dictionary with p, q, v
+    """
+    repeat = _sample(np.flatnonzero((x > 0) & (m > 0)), sample, random_state)
+    p, q, v = _fit(gamma_gamma_log_likelihood, 3, np.ones(len(repeat)), penalizer, x[repeat], m[repeat])
+    return {'p': p, 'q': q, 'v': v}
+
+
+def expected_purchases(params, t, x, t_x, T):
+    """Expected purchases of each customer in the next t days (BG/NBD)"""
+    from scipy.special import hyp2f1
+
+    r, alpha, a, b = params['r'], params['alpha'], params['a'], params['b']
+    hyp_term = hyp2f1(r + x, b + x, a + b + x - 1, t / (alpha + T + t))
+    numerator = (a + b + x - 1) / (a - 1) * (1 - hyp_term * ((alpha + T) / (alpha + T + t)) ** (r + x))
+    denominator = 1 + (x > 0) * (a / (b + np.maximum(x, 1) - 1)) * ((alpha + T) / (alpha + t_x)) ** (r + x)
+    return numerator / denominator
+
+
+def expected_order_value(params, x, m):
+    """Expected value of each customer's future orders (Gamma-Gamma)"""
+    p, q, v = params['p'], params['q'], params['v']
+    return p * (v + x * m) / (p * x + q - 1)
+
+
+def discounted_purchases(params, triples, months=DEFAULT_MONTHS, discount_rate=DEFAULT_DISCOUNT_RATE):
+    """Expected purchases in each coming month, discounted to today, summed per history"""
+    x, t_x, T = triples.T
+    total = np.zeros(len(triples))
+    previous = np.zeros(len(triples))
+    for month in range(1, months + 1):
+        cumulative = expected_purchases(params, month * DAYS_PER_MONTH, x, t_x, T)
+        total += (cumulative - previous) / (1 + discount_rate) ** month
+        previous = cumulative
+    return total
+
+
+def predict_clv(df, bgnbd, gamma_gamma, months=DEFAULT_MONTHS, discount_rate=DEFAULT_DISCOUNT_RATE,
+                workers=None, chunk_rows=CHUNK_ROWS):
+    """
+    CLV_Predictive of every customer
+
+    Parameters:
+    bgnbd, gamma_gamma: fitted parameters (fit_bgnbd, fit_gamma_gamma)
+    months: prediction horizon
+    discount_rate: monthly discount rate
+    workers: number of processes (default: all cores)
+
+    Returns:
+    float64 array aligned with df
+    """
+    x, t_x, T, m = clv_inputs(df)
+    codes, triples, _ = compress_histories(x, t_x, T)
+
+    chunks = [triples[start:start + chunk_rows] for start in range(0, len(triples), chunk_rows)]
+    workers = min(workers or os.cpu_count() or 1, max(len(chunks), 1))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            purchases = list(pool.map(discounted_purchases, [bgnbd] * len(chunks), chunks,
+                                      [months] * len(chunks), [discount_rate] * len(chunks)))
+    else:
+        purchases = [discounted_purchases(bgnbd, chunk, months, discount_rate) for chunk in chunks]
+
+    purchases = np.concatenate(purchases) if purchases else np.empty(0)
+    return purchases[codes] * expected_order_value(gamma_gamma, x, m)
+
+
+def clv_tiers(clv, thresholds=None):
+    """
+    CLV_Segment (Diamond ... Bronze) of each customer
+
+    Parameters:
+    thresholds: lower CLV bound of Diamond, Platinum, Gold and Silver
+                (default: the CLV_TIER_QUANTILES of the non-missing clv)
+
+    Returns:
+    (Categorical Series, thresholds); a missing CLV has no tier
+    """
+    clv = np.asarray(clv, dtype='float64')
+    missing = np.isnan(clv)
+    if thresholds is None:
+        thresholds = np.nanquantile(clv, CLV_TIER_QUANTILES).tolist() if (~missing).any() else [0.0] * 4
+    # Ascending edges; each tier includes its lower bound
+    tier = np.searchsorted(np.asarray(thresholds[::-1], dtype='float64'), clv, side='right')
+    codes = np.where(missing, -1, len(CLV_SEGMENTS) - 1 - tier)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=CLV_SEGMENTS)), thresholds
+
+
+def apply_clv_model(df, model, workers=None):
+    """Add CLV_Predictive and CLV_Segment from a fitted model (see score_clv)"""
+    clv = predict_clv(df, model['bgnbd'], model['gamma_gamma'], model['months'],
+                      model['discount_rate'], workers)
+    segments, _ = clv_tiers(clv, model['tier_thresholds'])
+    df['CLV_Predictive'] = clv
+    df['CLV_Segment'] = segments.to_numpy()
+    return df
+
+
+def score_clv(df, months=DEFAULT_MONTHS, discount_rate=DEFAULT_DISCOUNT_RATE, penalizer=DEFAULT_PENALIZER,
+              workers=None):
+    """
+    Fit BG/NBD + Gamma-Gamma and add CLV_Predictive and CLV_Segment
+
+    Tier thresholds are the CLV_TIER_QUANTILES of this population; they are
+    kept in the model so later scoring uses the same tiers.
+
+    Returns:
+    (df, model) where model holds the fitted parameters and tier thresholds
+    """
+    x, t_x, T, m = clv_inputs(df)
+    bgnbd = fit_bgnbd(x, t_x, T, penalizer)
+    gamma_gamma = fit_gamma_gamma(x, m, penalizer)
+
+    clv = predict_clv(df, bgnbd, gamma_gamma, months, discount_rate, workers)
+    segments, thresholds = clv_tiers(clv)
+
+    df['CLV_Predictive'] = clv
+    df['CLV_Segment'] = segments.to_numpy()
+    model = {
+        'bgnbd': {name: float(value) for name, value in bgnbd.items()},
+        'gamma_gamma': {name: float(value) for name, value in gamma_gamma.items()},
+        'months': months,
+        'discount_rate': discount_rate,
+        'tier_thresholds': [float(value) for value in thresholds],
+    }
+    return df, model
@@ -0,0 +1,157 @@
+"""
+Materialized aggregate cube over the customer frame.
+
+The cube groups customers by every segment/cluster/score dimension once and
+stores the customer count and, for each measure, its non-missing count,
+sum, sum of squares, min and max per cell (aggregated by the database when
+the data has one). Means and deviations divide by the measure's own count,
+so customers missing a measure do not pull its average down.
+Dashboard summaries roll the cells up to the dimensions they need, so their
+cost depends on the number of cells rather than the number of customers.
+"""
+
+import numpy as np
+import pandas as pd
+
+from analytics.dataset import COLUMN_ALIASES
+from analytics.schema import apply_schema
+
+DIMENSIONS = ['Customer_Segment', 'Cluster_Name', 'Cluster', 'CLV_Segment',
+              'R_Score', 'F_Score', 'M_Score']
+MEASURES = ['Recency', 'Frequency', 'Monetary', 'CLV_Predictive']
+
+
+class AggregateCube:
+    """Per-cell customer count, plus count, sum, sum of squares, min and max for each measure"""
+
+    def __init__(self, cells, dimensions, measures):
+        self.cells = cells
+        self.dimensions = dimensions
+        self.measures = measures
+
+    @classmethod
+    def build(cls, df):
+        """Build the cube from a frame holding the dimension and measure columns"""
+        dimensions = [column for column in DIMENSIONS if column in df.columns]
+        measures = [column for column in MEASURES if column in df.columns]
+
+        work = df[dimensions].copy()
+        aggregations = {'count': (measures[0], 'size')}
+        for measure in measures:
+            values = df[measure].astype('float64')
+            work[measure] = values
+            work[f"{measure}_sq"] = values * values
+            aggregations[f"{measure}_count"] = (measure, 'count')
+            aggregations[f"{measure}_sum"] = (measure, 'sum')
+            aggregations[f"{measure}_sumsq"] = (f"{measure}_sq", 'sum')
+            aggregations[f"{measure}_min"] = (measure, 'min')
+            aggregations[f"{measure}_max"] = (measure, 'max')
+
+        cells = work.groupby(dimensions, observed=True, dropna=False).agg(**aggregations).reset_index()
+        return cls(cells, dimensions, measures)
+
+    @classmethod
+    def from_dataset(cls, data):
+        """
+        Build the cube from a CustomerDataset, loading only the columns it needs
+
+        With a database the cells are a GROUP BY query and no customer rows
+        are loaded; the dimensions get the declared schema as they would in
+        the dataset.
+        """
+        if data.database is not None:
+            return cls.from_search(data.database)
+
+        columns = [column for column in DIMENSIONS + MEASURES if column in data.available]
+        return cls.build(data.frame(columns))
+
+    @classmethod
+    def from_search(cls, search, filters=None, ranges=None):
+        """
+        Build the cube of an explorer selection from its search backend
+
+        A CLV range cannot be answered from the cube's cells (CLV_Predictive
+        is a measure, not a dimension), so the KPIs of such a selection come
+        from a cube over just its customers: a GROUP BY of the matches in the
+        database, or the matched rows of the bitmap index.
+
+        Parameters:
+        search: CustomerDatabase or BitmapSearch (CustomerDataset.search())
+        filters, ranges: the selection, as passed to search.count()
+        """
+        dimensions = [column for column in DIMENSIONS if column in search.columns]
+        measures = [column for column in MEASURES if column in search.columns]
+        cells, _ = apply_schema(search.cube_cells(dimensions, measures, filters, ranges))
+        return cls(cells, dimensions, measures)
+
+    def resolve(self, column):
+        """Stored dimension for a requested column name"""
+        column = COLUMN_ALIASES.get(column, column)
+        if column not in self.dimensions:
+            raise KeyError(f"'{column}' is not a cube dimension")
+        return column
+
+    def select(self, filters=None):
+        """
+        Cells matching the filters
+
+        Parameters:
+        filters: dict mapping a dimension to the list of values to keep
+        """
+        cells = self.cells
+        if filters:
+            mask = np.ones(len(cells), dtype=bool)
+            for column, values in filters.items():
+                mask &= cells[self.resolve(column)].isin(values).to_numpy()
+            cells = cells[mask]
+        return cells
+
+    def rollup(self, by, filters=None):
+        """
+        Merge cells up to the requested dimensions
+
+        Returns:
+        DataFrame indexed by the `by` dimension with count and, for each
+        measure, <measure>_count, _sum, _sumsq, _min and _max
+        """
+        cells = self.select(filters)
+        aggregations = {'count': 'sum'}
+        for measure in self.measures:
+            aggregations.update({
+                f"{measure}_count": 'sum',
+                f"{measure}_sum": 'sum',
+                f"{measure}_sumsq": 'sum',
+                f"{measure}_min": 'min',
+                f"{measure}_max": 'max',
+            })
+
+        rolled = cells.groupby(self.resolve(by), observed=True).agg(aggregations)
+        rolled.index.name = by
+        return rolled
+
+    def summary(self, by, means=(), sums=(), filters=None):
+        """
+        Count plus the mean and total of the requested measures per group
+
+        Returns:
+        DataFrame with a Count column, Avg_<measure> for each of `means` and
+        Total_<measure> for each of `sums`, sorted by the group labels
+        """
+        rolled = self.rollup(by, filters)
+        summary = pd.DataFrame({'Count': rolled['count']}, index=rolled.index)
+        for measure in means:
+            summary[f"Avg_{measure}"] = rolled[f"{measure}_sum"] / rolled[f"{measure}_count"]
+        for measure in sums:
+            summary[f"Total_{measure}"] = rolled[f"{measure}_sum"]
+        return summary
+
+    def counts(self, by, filters=None):
+        """Customer count per group, largest first (like value_counts)"""
+        return self.rollup(by, filters)['count'].sort_values(ascending=False)
+
+
+def std(rolled, measure):
+    """Sample standard deviation of a measure from rolled-up aggregates (ignoring missing values)"""
+    n = rolled[f"{measure}_count"]
+    variance = (rolled[f"{measure}_sumsq"] - rolled[f"{measure}_sum"] ** 2 / n) / (n - 1)
+    return np.sqrt(variance.clip(lower=0))
@@ -0,0 +1,309 @@
+"""
+Embedded SQLite backend for the customer table.
+
+A publish can also write the customer frame to a SQLite file next to the
+snapshot, indexed on the explorer filter and sort columns. When it is
+current, the dashboards push the work that would otherwise need every
+customer in memory down to it: explorer filters and CLV ranges become a
+WHERE clause, sorting and paging an ORDER BY ... LIMIT / OFFSET, exports
+a cursor read chunk by chunk, and the aggregate cube a GROUP BY. Only the
+rows of one page, one export chunk or the cube cells reach pandas, so the
+explorer and the aggregates work on tables larger than the host's RAM.
+
+Queries are parameterized: the SQL text depends only on which columns are
+filtered and how many values are selected, so each connection's statement
+cache reuses the prepared statements across reruns. Connections are
+read-only and come from a per-process ConnectionPool, shared by every
+Streamlit session.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from analytics.dataset import COLUMN_ALIASES
+from analytics.export import CHUNK_ROWS
+from analytics.schema import CATEGORICAL_COLUMNS
+
+TABLE = 'customers'
+
+# Explorer filters (sidebar slice, segment / tier / cluster selections), then
+# the CLV range: a filter is a few index seeks per combination of the values
+FILTER_INDEX_COLUMNS = ['Customer_Segment', 'CLV_Segment', 'Cluster', 'Cluster_Name', 'CLV_Predictive']
+SORT_INDEX_COLUMNS = ['CLV_Predictive', 'Monetary', 'Frequency', 'Recency', 'AOV']
+
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+MMAP_MB = 1024
+
+
+def quote(column):
+    """SQL identifier for a column name"""
+    return '"' + column.replace('"', '""') + '"'
+
+
+def write_database(df, path, chunk_rows=CHUNK_ROWS):
+    """
+    Write the customer frame to a SQLite file and index it for the dashboards
+
+    Rows keep the frame's order (their rowid is the row position). The file
+    is written to a temporary name first and then renamed, so a reader never
+    sees a half-written database.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.unlink(missing_ok=True)
+
+    with closing(sqlite3.connect(tmp_path)) as connection:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        df.to_sql(TABLE, connection, index=False, chunksize=chunk_rows)
+
+        filter_columns = [column for column in FILTER_INDEX_COLUMNS if column in df.columns]
+        if filter_columns:
+            connection.execute(f"CREATE INDEX {TABLE}_filters ON {TABLE} "
+                               f"({', '.join(quote(column) for column in filter_columns)})")
+        for column in SORT_INDEX_COLUMNS:
+            if column in df.columns:
+                connection.execute(f"CREATE INDEX {quote(f'{TABLE}_{column}')} ON {TABLE} ({quote(column)})")
+
+        connection.execute("ANALYZE")
+        connection.commit()
+    os.replace(tmp_path, path)
+
+
+class ConnectionPool:
+    """Read-only connections to a database file, shared by the threads of a process"""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = Path(path).resolve()
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        connection = sqlite3.connect(f"{self.path.as_uri()}?mode=ro", uri=True, check_same_thread=False,
+                                     cached_statements=STATEMENT_CACHE_SIZE)
+        connection.execute("PRAGMA query_only = ON")
+        connection.execute(f"PRAGMA mmap_size = {MMAP_MB * 1024**2}")
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """An idle connection (opened on demand), waiting while all of them are in use"""
+        self._slots.acquire()
+        try:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+            try:
+                yield connection
+            finally:
+                self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class CustomerDatabase:
+    """
+    Explorer queries and cube aggregates answered by the SQLite file
+
+    Offers the same explorer methods as analytics.bitmap.BitmapSearch.
+    Safe to share between Streamlit sessions.
+    """
+
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = Path(path)
+        self.pool = ConnectionPool(self.path, pool_size)
+        self._values = {}
+        self._bounds = {}
+        with self.pool.connection() as connection:
+            self.columns = [row[1] for row in connection.execute(f"PRAGMA table_info({TABLE})")]
+            self.n = connection.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+
+    def resolve(self, column):
+        """Name of the stored column that backs a requested column"""
+        if column not in self.columns and column in COLUMN_ALIASES:
+            return COLUMN_ALIASES[column]
+        return column
+
+    def _column(self, column):
+        stored = self.resolve(column)
+        if stored not in self.columns:
+            raise KeyError(f"Column not in database: {column}")
+        return quote(stored)
+
+    def _fetch(self, sql, params=()):
+        with self.pool.connection() as connection:
+            return connection.execute(sql, params).fetchall()
+
+    def values(self, column):
+        """Distinct values of a column, in the declared category order when it has one"""
+        stored = self.resolve(column)
+        if stored not in self._values:
+            sql = (f"SELECT DISTINCT {self._column(column)} FROM {TABLE} "
+                   f"WHERE {self._column(column)} IS NOT NULL ORDER BY 1")
+            values = [row[0] for row in self._fetch(sql)]
+            if stored in CATEGORICAL_COLUMNS:
+                categories = CATEGORICAL_COLUMNS[stored][0]
+                values.sort(key=lambda value: categories.index(value) if value in categories else len(categories))
+            self._values[stored] = values
+        return list(self._values[stored])
+
+    def bounds(self, column):
+        """(min, max) of a numeric column, ignoring missing values"""
+        stored = self.resolve(column)
+        if stored not in self._bounds:
+            low, high = self._fetch(f"SELECT MIN({self._column(column)}), MAX({self._column(column)}) FROM {TABLE}")[0]
+            self._bounds[stored] = (0.0, 0.0) if low is None else (float(low), float(high))
+        return self._bounds[stored]
+
+    def _where(self, filters=None, ranges=None, indexed=None):
+        """
+        WHERE clause and parameters of a selection
+
+        Parameters:
+        filters: {column: allowed values}; values are ORed, columns ANDed
+        ranges: {column: (low, high)}, inclusive; None leaves a side open
+        indexed: stored columns whose terms may be answered from an index
+                 (default: all); the others are only checked row by row
+        """
+        def term(column):
+            if indexed is None or self.resolve(column) in indexed:
+                return self._column(column)
+            return f"+{self._column(column)}"
+
+        clauses = []
+        params = []
+        for column, values in (filters or {}).items():
+            values = [value.item() if hasattr(value, 'item') else value for value in values]
+            if not values:
+                clauses.append("0")
+                continue
+            clauses.append(f"{term(column)} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        for column, (low, high) in (ranges or {}).items():
+            if low is not None:
+                clauses.append(f"{term(column)} >= ?")
+                params.append(float(low))
+            if high is not None:
+                clauses.append(f"{term(column)} <= ?")
+                params.append(float(high))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, filters=None, ranges=None):
+        """Number of customers matching every filter and range"""
+        # With value filters, seek the filter index and check the CLV range in
+        # its entries (covering) rather than fetching each row in the range
+        indexed = {self.resolve(column) for column in filters} if filters else None
+        where, params = self._where(filters, ranges, indexed)
+        return self._fetch(f"SELECT COUNT(*) FROM {TABLE}{where}", params)[0][0]
+
+    def _select(self, columns, filters, ranges, sort_column, ascending, stop=None):
+        """
+        Ordered SELECT of a selection
+
+        Like BitmapIndex.ordered_rows and paging.top_k: when the matches are
+        dense enough that the first `stop` of them come early in the sort
+        column's order, walk that column's index and check each row;
+        otherwise seek the filter index and sort only the matches.
+        """
+        sort_stored = self.resolve(sort_column)
+        matches = self.count(filters, ranges)
+        stop = matches if stop is None else stop
+        walk = matches * matches >= stop * self.n
+
+        if walk:
+            where, params = self._where(filters, ranges, indexed={sort_stored})
+            key = self._column(sort_column)
+        else:
+            where, params = self._where(filters, ranges, indexed={self.resolve(column) for column in filters or {}})
+            key = f"+{self._column(sort_column)}"
+
+        # Same order as BitmapIndex.ordered_rows and paging.top_k: missing
+        # values last, ties by row order in the sort direction
+        direction = 'ASC' if ascending else 'DESC'
+        nulls = ' NULLS LAST' if ascending else ''
+        projection = ', '.join(f"{self._column(column)} AS {quote(column)}" for column in columns)
+        return f"SELECT {projection} FROM {TABLE}{where} ORDER BY {key} {direction}{nulls}, rowid {direction}", params
+
+    def page(self, columns, filters=None, ranges=None, sort_column='CLV_Predictive', ascending=False,
+             start=0, stop=None):
+        """
+        Customers ranked start..stop among the matches, as a DataFrame
+
+        Parameters:
+        columns: columns to return (dashboard names)
+        sort_column, ascending: result order; missing values go last
+        """
+        sql, params = self._select(columns, filters, ranges, sort_column, ascending, stop)
+        if stop is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [max(stop - start, 0), start]
+        elif start:
+            sql += " LIMIT -1 OFFSET ?"
+            params = params + [start]
+        return pd.DataFrame.from_records(self._fetch(sql, params), columns=list(columns))
+
+    def chunks(self, columns, filters=None, ranges=None, sort_column='CLV_Predictive', ascending=False,
+               chunk_rows=CHUNK_ROWS):
+        """Every matching customer in result order, chunk_rows at a time (for exports)"""
+        sql, params = self._select(columns, filters, ranges, sort_column, ascending)
+        with self.pool.connection() as connection:
+            cursor = connection.execute(sql, params)
+            try:
+                rows = cursor.fetchmany(chunk_rows)
+                yield pd.DataFrame.from_records(rows, columns=list(columns))  # one empty chunk for no rows
+                while len(rows) == chunk_rows:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if rows:
+                        yield pd.DataFrame.from_records(rows, columns=list(columns))
+            finally:
+                cursor.close()
+
+    def cube_cells(self, dimensions, measures, filters=None, ranges=None):
+        """
+        Cells of the aggregate cube, grouped by the database
+
+        Parameters:
+        filters, ranges: optional explorer selection; only its customers
+                         are aggregated
+
+        Returns:
+        DataFrame with the dimensions, count and <measure>_count, _sum, _sumsq,
+        _min and _max per cell, as built by analytics.cube.AggregateCube.build
+        """
+        aggregates = ["COUNT(*) AS count"]
+        for measure in measures:
+            column = f"CAST({self._column(measure)} AS REAL)"
+            aggregates += [
+                f"COUNT({column}) AS {quote(f'{measure}_count')}",
+                f"TOTAL({column}) AS {quote(f'{measure}_sum')}",
+                f"TOTAL({column} * {column}) AS {quote(f'{measure}_sumsq')}",
+                f"MIN({column}) AS {quote(f'{measure}_min')}",
+                f"MAX({column}) AS {quote(f'{measure}_max')}",
+            ]
+        keys = ', '.join(self._column(dimension) for dimension in dimensions)
+        where, params = self._where(filters, ranges)
+        sql = f"SELECT {keys}, {', '.join(aggregates)} FROM {TABLE}{where} GROUP BY {keys}"
+        with self.pool.connection() as connection:
+            cursor = connection.execute(sql, params)
+            names = [description[0] for description in cursor.description]
+            return pd.DataFrame.from_records(cursor.fetchall(), columns=names)
+
+    def close(self):
+        self.pool.close()
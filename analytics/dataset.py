@@ -0,0 +1,238 @@
+"""
+Column-projected, lazily loaded handle on the published customer data.
+
+Each dashboard page declares the columns it reads. The handle loads a column
+the first time any page asks for it, applies the declared schema to it and
+keeps it for every later request, so memory and time-to-first-chart depend
+on the pages that have been opened rather than on the width of the export.
+When the publish included the SQLite database, the explorer and the
+aggregate cube query it instead of loading customer rows.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics.schema import apply_schema
+from analytics.snapshot import (CSV_FILE, DATA_DIR, DATABASE_FILE, SNAPSHOT_FILE, STATS_FILE,
+                                STATS_METADATA_KEY, database_is_current, enable_copy_on_write,
+                                read_manifest, snapshot_is_current)
+
+# Names the dashboards use for columns the notebook exports under another name
+COLUMN_ALIASES = {
+    'Segment': 'Customer_Segment',
+    'KMeans_Cluster': 'Cluster',
+}
+
+# Histograms kept per dataset (i.e. per data version), least recently used first out
+HISTOGRAM_CACHE_SIZE = 128
+
+
+class CustomerDataset:
+    """
+    Lazily loaded customer data
+
+    Reads from the memory-mapped Arrow snapshot when it is current and from
+    the CSV export otherwise. Safe to share between Streamlit sessions.
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        enable_copy_on_write()
+
+        self.data_dir = Path(data_dir)
+        self._table = None
+        self._columns = {}
+        self._memory = {'before_mb': 0.0, 'after_mb': 0.0}
+        self._cube = None
+        self._kpi_engine = None
+        self._bitmap_index = None
+        self._histograms = OrderedDict()
+        self._lock = threading.Lock()
+        self._cube_lock = threading.Lock()
+
+        source = self.data_dir / SNAPSHOT_FILE
+        if snapshot_is_current(self.data_dir):
+            try:
+                self._table, self.stats = self._open_snapshot(source)
+            except ImportError:
+                pass
+
+        if self._table is None:
+            source = self.data_dir / CSV_FILE
+            self.available = list(pd.read_csv(source, nrows=0).columns)
+            with open(self.data_dir / STATS_FILE, 'r') as f:
+                self.stats = json.load(f)
+        else:
+            self.available = list(self._table.column_names)
+
+        # Explorer queries and cube aggregates are pushed down to the database
+        self.database = None
+        if database_is_current(self.data_dir):
+            from analytics.database import CustomerDatabase
+
+            self.database = CustomerDatabase(self.data_dir / DATABASE_FILE)
+
+        # Version of the publish (content hash from the manifest), or of the
+        # source file for data published without a manifest
+        self.source = source
+        self.manifest = read_manifest(self.data_dir)
+        if self.manifest is not None:
+            self.version = self.manifest['version']
+            self.built_at = self.manifest['built_at']
+        else:
+            source_stat = source.stat()
+            self.version = f"{source.name}:{source_stat.st_size}:{source_stat.st_mtime_ns}"
+            self.built_at = None
+
+    @staticmethod
+    def _open_snapshot(path):
+        """Map the snapshot; column data is only paged in when it is read"""
+        import pyarrow as pa
+
+        with pa.memory_map(str(path), 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+
+        return table, json.loads(table.schema.metadata[STATS_METADATA_KEY])
+
+    def resolve(self, column):
+        """Name of the stored column that backs a requested column"""
+        if column not in self.available and column in COLUMN_ALIASES:
+            return COLUMN_ALIASES[column]
+        return column
+
+    def missing(self, columns):
+        """Requested columns that are not in the dataset"""
+        return [column for column in columns if self.resolve(column) not in self.available]
+
+    def _load(self, names):
+        """Read, type and cache stored columns that are not loaded yet"""
+        with self._lock:
+            names = [name for name in names if name not in self._columns]
+            if not names:
+                return
+
+            if self._table is not None:
+                loaded = self._table.select(names).to_pandas(split_blocks=True)
+            else:
+                loaded = pd.read_csv(self.source, usecols=names)[names]
+
+            loaded, report = apply_schema(loaded)
+            self._memory['before_mb'] += report['before_mb']
+            self._memory['after_mb'] += report['after_mb']
+            for name in names:
+                self._columns[name] = loaded[name]
+
+    def frame(self, columns):
+        """
+        DataFrame with the requested columns, loading any that are not cached
+
+        The result is a Copy-on-Write view over the cached columns; changing
+        it never affects other pages or sessions.
+        """
+        missing = self.missing(columns)
+        if missing:
+            raise KeyError(f"Columns not in dataset: {', '.join(missing)}")
+
+        stored = [self.resolve(column) for column in columns]
+        self._load(list(dict.fromkeys(stored)))
+        return pd.DataFrame({column: self._columns[name] for column, name in zip(columns, stored)},
+                            copy=False)
+
+    def cube(self):
+        """Aggregate cube for this data version, built on first use"""
+        from analytics.cube import AggregateCube
+
+        with self._cube_lock:
+            if self._cube is None:
+                self._cube = AggregateCube.from_dataset(self)
+        return self._cube
+
+    def kpi_engine(self):
+        """Cross-filter KPI engine over this version's aggregate cube"""
+        from analytics.kpi import KpiEngine
+
+        cube = self.cube()
+        with self._cube_lock:
+            if self._kpi_engine is None:
+                self._kpi_engine = KpiEngine(cube)
+        return self._kpi_engine
+
+    def bitmap_index(self):
+        """Bitmap and sorted indexes of the explorer filter columns, built on first use"""
+        from analytics.bitmap import BitmapIndex
+
+        with self._cube_lock:
+            if self._bitmap_index is None:
+                self._bitmap_index = BitmapIndex.from_dataset(self)
+        return self._bitmap_index
+
+    def search(self):
+        """Explorer queries: run by the database when there is one, else from the bitmap index"""
+        if self.database is not None:
+            return self.database
+
+        from analytics.bitmap import BitmapSearch
+
+        return BitmapSearch(self.bitmap_index(), self)
+
+    def histogram(self, column, bins=30, range=None, filters=None):
+        """
+        Bin edges, counts and mean of a column for a slice, cached
+
+        Computed once per data version, bin setting and slice, so the
+        dashboards only send the bars to the browser.
+
+        Parameters:
+        filters: {column: allowed values} slice (default: every customer)
+        """
+        from analytics.charts import compute_histogram
+
+        filters = filters or {}
+        key = (column, bins, range, tuple(sorted((name, tuple(values)) for name, values in filters.items())))
+        with self._cube_lock:
+            if key in self._histograms:
+                self._histograms.move_to_end(key)
+                return self._histograms[key]
+
+        df = self.frame([column] + [name for name in filters if name != column])
+        values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+        if filters:
+            mask = np.ones(len(df), dtype=bool)
+            for name, allowed in filters.items():
+                mask &= df[name].isin(allowed).to_numpy()
+            values = values[mask]
+        histogram = compute_histogram(values, bins, range)
+
+        with self._cube_lock:
+            self._histograms[key] = histogram
+            while len(self._histograms) > HISTOGRAM_CACHE_SIZE:
+                self._histograms.popitem(last=False)
+        return histogram
+
+    def warm(self, like):
+        """
+        Load the columns and build the indexes another dataset has in use
+
+        Used on a new data version before it replaces the old one, so the
+        first reruns after the swap find the same caches warm.
+        """
+        self._load([name for name in like.loaded_columns if name in self.available])
+        if like._cube is not None:
+            self.cube()
+        if like._kpi_engine is not None:
+            self.kpi_engine()
+        if like._bitmap_index is not None and self.database is None:
+            self.bitmap_index()
+        return self
+
+    @property
+    def loaded_columns(self):
+        return list(self._columns)
+
+    def memory_usage(self):
+        """Memory of the loaded columns in MB, before and after the schema"""
+        return {key: round(value, 2) for key, value in self._memory.items()}
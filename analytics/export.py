@@ -0,0 +1,184 @@
+"""
+Chunked, compressed exports of a filtered customer set.
+
+An export is written CHUNK_ROWS customers at a time straight to a file
+(gzip-compressed CSV, or Parquet when pyarrow is installed), so its peak
+memory is one chunk whatever the number of rows, and nothing is held as
+one big string. Chunks come from the loaded frame (frame_chunks) or from
+a database cursor. Exports larger than a chunk are written by an ExportJob
+on a background thread; the dashboard polls its progress and serves the
+finished temporary file for download. Finished files are removed when
+the session starts another export or after EXPORT_MAX_AGE_S.
+"""
+
+import gzip
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# (file extension, MIME type) per export format
+EXPORT_FORMATS = {
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+CHUNK_ROWS = 100_000
+
+# Fastest gzip level: about 6x faster than the default for ~10% larger CSV files
+GZIP_LEVEL = 1
+EXPORT_DIR = Path(tempfile.gettempdir()) / 'customer-analytics-exports'
+EXPORT_MAX_AGE_S = 24 * 3600
+
+
+def available_formats():
+    """Export formats usable here (Parquet needs pyarrow)"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return [name for name in EXPORT_FORMATS if name != 'Parquet']
+    return list(EXPORT_FORMATS)
+
+
+def frame_chunks(df, rows, chunk_rows=CHUNK_ROWS):
+    """Given rows of a frame, in order, chunk_rows at a time (one empty chunk for no rows)"""
+    for start in range(0, max(len(rows), 1), chunk_rows):
+        yield df.iloc[rows[start:start + chunk_rows]]
+
+
+def write_export(chunks, path, fmt, progress=None):
+    """
+    Write frames to a file, one chunk at a time
+
+    The file is written to a temporary name first and then renamed, so a
+    reader never sees a half-written export.
+
+    Parameters:
+    chunks: frames to write, in output order, all with the same columns
+    fmt: one of EXPORT_FORMATS
+    progress: called with the number of rows written after each chunk
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    written = 0
+
+    if fmt == 'Parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in chunks:
+                # Later chunks take the first one's types (e.g. a column that is all missing)
+                table = pa.Table.from_pandas(chunk, schema=writer.schema if writer else None,
+                                             preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(str(tmp_path), table.schema)
+                writer.write_table(table)
+                written += len(chunk)
+                if progress:
+                    progress(written)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with gzip.open(tmp_path, 'wt', newline='', compresslevel=GZIP_LEVEL) as f:
+            for chunk in chunks:
+                chunk.to_csv(f, index=False, header=written == 0)
+                written += len(chunk)
+                if progress:
+                    progress(written)
+    os.replace(tmp_path, path)
+
+
+def prune_exports(export_dir=EXPORT_DIR, max_age=EXPORT_MAX_AGE_S):
+    """Remove exports (and leftover partial files) older than max_age seconds"""
+    cutoff = time.time() - max_age
+    for path in Path(export_dir).glob('*'):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+class ExportJob:
+    """
+    One export of a filtered customer set, written to a temporary file
+
+    Jobs of more than one chunk run on a background thread; the rest are
+    written on start(). Safe to poll from another thread.
+    """
+
+    def __init__(self, chunks, total, fmt, file_name, chunk_rows=CHUNK_ROWS, export_dir=EXPORT_DIR):
+        extension, self.mime = EXPORT_FORMATS[fmt]
+        export_dir = Path(export_dir)
+        export_dir.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=f'.{extension}', dir=export_dir)
+        os.close(fd)
+
+        self.path = Path(path)
+        self.file_name = f"{file_name}.{extension}"
+        self.fmt = fmt
+        self.total = total
+        self.written = 0
+        self.error = None
+        self._chunks = chunks
+        self._chunk_rows = chunk_rows
+        self._thread = None
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+
+    def _run(self):
+        try:
+            write_export(self._chunks, self.path, self.fmt, self._report)
+        except Exception as e:
+            self.error = e
+        finally:
+            # Release the chunk source (e.g. a pooled database connection)
+            close = getattr(self._chunks, 'close', None)
+            if close is not None:
+                close()
+            self._chunks = None
+            self._finished.set()
+
+    def _report(self, written):
+        self.written = written
+        if self._cancelled.is_set():
+            raise InterruptedError("Export discarded")
+
+    def start(self):
+        """Write the export, in the background when it spans several chunks"""
+        if self.total <= self._chunk_rows:
+            self._run()
+        else:
+            self._thread = threading.Thread(target=self._run, name=f"export-{self.path.stem}", daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    @property
+    def progress(self):
+        """Fraction of the rows written so far"""
+        return 1.0 if self.done or not self.total else self.written / self.total
+
+    def open(self):
+        """Binary file object of the finished export"""
+        return open(self.path, 'rb')
+
+    def size_mb(self):
+        return self.path.stat().st_size / 1024**2 if self.path.exists() else 0.0
+
+    def discard(self):
+        """Stop the writer after its current chunk and delete the export file"""
+        self._cancelled.set()
+        self._finished.wait()
+        for path in (self.path, self.path.with_name(self.path.name + '.tmp')):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
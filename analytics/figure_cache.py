@@ -0,0 +1,136 @@
+"""
+Process-wide cache of built Plotly figures.
+
+Every Streamlit rerun used to rebuild each chart, even when only an
+unrelated widget changed. A figure depends only on the data version, the
+chart and a few parameters (slice, selected axes, ...), so FigureCache
+keeps built figures under that key, shared by every session, and a rerun
+whose chart inputs did not change skips building the figure. It skips
+construction only: st.plotly_chart takes a figure object and serializes
+it again on every rerun, so that cost remains.
+
+Entries are sized by an estimate of their JSON (what Streamlit sends to
+the browser), taken from the trace and layout properties without
+serializing the figure: numeric arrays by their base64 encoding, long
+lists and text arrays from a sample of their items. They are evicted
+least recently used first once the cache holds more than max_mb. Hits,
+misses and evictions are counted for the dashboards. Cached figures are
+shared: callers must not modify them.
+"""
+
+import base64
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+FIGURE_CACHE_MB = 256
+
+# Items measured per long list or text array when estimating its JSON size
+SIZE_SAMPLE = 100
+
+
+def figure_key(*parts):
+    """Hashable cache key from strings, numbers and (nested) dicts and lists"""
+    def freeze(value):
+        if isinstance(value, dict):
+            return tuple(sorted((str(name), freeze(item)) for name, item in value.items()))
+        if isinstance(value, (list, tuple, set)):
+            return tuple(freeze(item) for item in value)
+        return value
+
+    return freeze(parts)
+
+
+def json_size(value):
+    """Approximate bytes of a figure property as Plotly JSON, without encoding it"""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in 'biuf':
+            # Sent base64-encoded, with its dtype (and shape); Plotly's JSON
+            # escapes each '/' of the encoding as the 6 characters \u002f
+            encoded = base64.b64encode(np.ascontiguousarray(value).tobytes())
+            return len(encoded) + 5 * encoded.count(b'/') + 40
+    if isinstance(value, dict):
+        return sum(len(str(name)) + 4 + json_size(item) for name, item in value.items()) + 2
+    if isinstance(value, (list, tuple, np.ndarray)):
+        if len(value) > SIZE_SAMPLE:
+            sample = value[::len(value) // SIZE_SAMPLE][:SIZE_SAMPLE]
+            return int(len(value) * sum(json_size(item) + 1 for item in sample) / len(sample)) + 2
+        return sum(json_size(item) + 1 for item in value) + 2
+    if isinstance(value, str):
+        return len(value) + 2
+    return len(str(value))
+
+
+def figure_size(value):
+    """Estimated bytes of the serialized figure(s) in a cached value"""
+    if isinstance(value, tuple):
+        return sum(figure_size(item) for item in value)
+    if hasattr(value, 'layout') and hasattr(value, 'data'):
+        return (sum(json_size(trace.to_plotly_json()) for trace in value.data)
+                + json_size(value.layout.to_plotly_json()))
+    return 0
+
+
+class FigureCache:
+    """Memory-bounded LRU cache of figures, keyed by (data version, chart id, parameters)"""
+
+    def __init__(self, max_mb=FIGURE_CACHE_MB):
+        self.max_bytes = int(max_mb * 1024**2)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version, chart_id, build, **params):
+        """
+        Cached figure for a chart, built with build() on a miss
+
+        Parameters:
+        version: data version the figure is built from
+        chart_id: name of the chart, unique per dashboard
+        build: function of no arguments returning the figure (or a tuple
+               holding it, e.g. (figure, note))
+        params: every other input the figure depends on
+        """
+        key = figure_key(version, chart_id, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        value = build()
+        size = figure_size(value)
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.bytes -= evicted
+                    self.evictions += 1
+        return value
+
+    def evict_version(self, version):
+        """Drop every figure built from a data version"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == version]:
+                self.bytes -= self._entries.pop(key)[1]
+                self.evictions += 1
+
+    def stats(self):
+        """Entry count, size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'mb': round(self.bytes / 1024**2, 2),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,69 @@
+"""
+Server-side pages of a sorted result without sorting the whole result.
+
+A page of a result ordered by one column only needs the first
+(page + 1) * page_size rows of that order. top_k finds them with a
+partial selection (np.partition, linear in the number of matches) and
+sorts just those, so fetching an early page of millions of matches costs
+one pass over the sort column. Ties are broken by row position in the
+sort direction (later rows first when descending) and missing values go
+last in both directions, so consecutive pages neither repeat nor skip
+rows, and pages match BitmapIndex.ordered_rows and the SQLite backend.
+"""
+
+import numpy as np
+
+PAGE_SIZES = [25, 50, 100, 250]
+DEFAULT_PAGE_SIZE = 50
+
+
+def page_count(total, page_size):
+    """Number of pages for total rows (at least one, so an empty result has page 1)"""
+    return max(-(-total // page_size), 1)
+
+
+def top_k(values, k, ascending=False):
+    """
+    Positions of the first k values in sorted order
+
+    Parameters:
+    values: numeric array
+    k: number of positions to return
+    ascending: sort direction; missing values go last either way
+
+    Returns:
+    Positions into values, in sort order (ties by position in the sort
+    direction)
+    """
+    values = np.asarray(values, dtype='float64')
+    if not ascending:
+        # Descending ties go later rows first: select on the reversed values
+        n = len(values)
+        return n - 1 - top_k(-values[::-1], k, ascending=True)
+    key = np.where(np.isnan(values), np.inf, values)
+    n = len(key)
+    k = min(max(int(k), 0), n)
+    if k == 0:
+        return np.empty(0, dtype='int64')
+
+    if k < n:
+        # Everything strictly before the k-th value, then the earliest of its ties
+        kth = np.partition(key, k - 1)[k - 1]
+        before = np.flatnonzero(key < kth)
+        ties = np.flatnonzero(key == kth)[:k - len(before)]
+        positions = np.concatenate([before, ties])
+    else:
+        positions = np.arange(n)
+    return positions[np.argsort(key[positions], kind='stable')]
+
+
+def page_positions(values, page, page_size, ascending=False):
+    """
+    Positions of one page of values in sorted order
+
+    Parameters:
+    page: zero-based page number
+    page_size: rows per page
+    """
+    start = max(int(page), 0) * page_size
+    return top_k(values, start + page_size, ascending)[start:]
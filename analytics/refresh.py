@@ -0,0 +1,184 @@
+"""
+Incremental refresh of the published customer frame.
+
+The partial RFM aggregates of every customer are kept in a state file next
+to the dashboard data. A refresh folds only the new transactions into that
+state, recomputes Recency for everyone from the new analysis date,
+rescores and resegments the customers and republishes the CSV, statistics
+and snapshot. It never reads the transaction history again, so its cost
+depends on the new transactions and the number of customers.
+
+When the notebook has saved a segmentation model (see
+analytics.segmentation_model), customers are scored and segmented against
+it, so labels stay comparable from day to day, and new customers or
+customers with new purchases are assigned its clusters; CLV_Predictive
+and CLV_Segment are rescored from its CLV model. Without one they
+are rescored into fresh quintiles and new customers are assigned by the
+saved cluster model (see analytics.clustering) or join the nearest
+existing cluster. Other customers keep their cluster (and CLV columns,
+when present) until the notebook is rerun.
+
+Usage:
+python -m analytics.refresh transactions.csv --init    # build the state from the full history
+python -m analytics.refresh new_transactions.csv       # fold in a day of transactions
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics.clustering import CLUSTER_FEATURES, load_cluster_model
+from analytics.clv import apply_clv_model
+from analytics.rfm import (DEFAULT_INVOICE_SKETCH, DEFAULT_MEMORY_MB, RfmAccumulator,
+                           add_customer_features, calculate_rfm_scores, fold_transactions,
+                           segment_customers)
+from analytics.segmentation_model import load_segmentation_model
+from analytics.snapshot import DATA_DIR, database_is_current, load_customer_data, publish_snapshot
+
+STATE_FILE = 'rfm_state.npz'
+
+
+def build_rfm_state(source, data_dir=DATA_DIR, memory_mb=DEFAULT_MEMORY_MB,
+                    invoice_sketch=DEFAULT_INVOICE_SKETCH):
+    """
+    Build the per-customer RFM state from the full transaction history
+
+    Parameters:
+    source: transaction file (CSV or Parquet), DataFrame or iterable of
+            DataFrames
+    """
+    accumulator = fold_transactions(source, memory_mb=memory_mb, invoice_sketch=invoice_sketch)
+    accumulator.save(Path(data_dir) / STATE_FILE)
+    return accumulator
+
+
+def nearest_clusters(previous, customers):
+    """
+    Cluster of the nearest existing centroid for each customer
+
+    Centroids are the mean standardized Recency/Frequency/Monetary of each
+    cluster in the previously published frame.
+    """
+    features = previous[CLUSTER_FEATURES].astype('float64')
+    mean, std = features.mean(), features.std(ddof=0).replace(0, 1)
+    centroids = ((features - mean) / std).groupby(previous['Cluster'].to_numpy()).mean()
+
+    scaled = ((customers[CLUSTER_FEATURES].astype('float64') - mean) / std).to_numpy()
+    distances = ((scaled[:, None, :] - centroids.to_numpy()[None, :, :]) ** 2).sum(axis=2)
+    return centroids.index.to_numpy()[distances.argmin(axis=1)]
+
+
+def carry_over(previous, customers, model=None):
+    """
+    Copy the columns the refresh does not derive (clusters, CLV) from the
+    previously published frame, matching customers by CustomerID
+
+    Parameters:
+    model: ClusterModel assigning new customers and customers whose
+           Frequency or Monetary changed (default: new customers join the
+           nearest cluster of the previous frame)
+    """
+    by_id = previous.set_index(previous['CustomerID'].astype('float64'))
+    ids = customers['CustomerID'].astype('float64')
+    extra = [column for column in previous.columns if column not in customers.columns]
+
+    for column in extra:
+        customers[column] = by_id[column].reindex(ids).to_numpy()
+
+    if 'Cluster' in extra:
+        new = ~ids.isin(by_id.index).to_numpy()
+        if model is not None:
+            for column in ['Frequency', 'Monetary']:
+                new |= ~np.isclose(by_id[column].reindex(ids).to_numpy(dtype='float64'),
+                                   customers[column].to_numpy(dtype='float64'))
+        if new.any():
+            if model is not None:
+                customers.loc[new, 'Cluster'] = model.predict(customers[new])
+            else:
+                customers.loc[new, 'Cluster'] = nearest_clusters(previous, customers[new])
+            if 'Cluster_Name' in extra:
+                if model is not None:
+                    names = pd.Series(model.names)
+                else:
+                    names = previous.drop_duplicates('Cluster').set_index('Cluster')['Cluster_Name']
+                customers.loc[new, 'Cluster_Name'] = names.reindex(customers.loc[new, 'Cluster']).to_numpy()
+        customers['Cluster'] = customers['Cluster'].astype('int64')
+
+    return customers[list(previous.columns) + [c for c in customers.columns if c not in previous.columns]]
+
+
+def refresh_customers(transactions, data_dir=DATA_DIR, analysis_date=None,
+                      memory_mb=DEFAULT_MEMORY_MB, database=None):
+    """
+    Fold new transactions into the state and republish the customer frame
+
+    Parameters:
+    transactions: new transaction file (CSV or Parquet), DataFrame or
+                  iterable of DataFrames
+    analysis_date: Reference date for recency (default: day after the last
+                   purchase in the state)
+    database: also publish the SQLite database (default: when the current
+              publish has one)
+
+    Returns:
+    The dashboard statistics that were published
+    """
+    data_dir = Path(data_dir)
+    state_path = data_dir / STATE_FILE
+    if not state_path.exists():
+        raise FileNotFoundError(f"No RFM state at {state_path}; build it with build_rfm_state() first")
+    if database is None:
+        database = database_is_current(data_dir)
+
+    accumulator = fold_transactions(transactions, RfmAccumulator.load(state_path), memory_mb)
+
+    customers = accumulator.result(analysis_date)
+    segmentation = load_segmentation_model(data_dir)
+    if segmentation is not None:
+        scores = segmentation.assign(customers, clusters=False)
+        customers[list(scores.columns)] = scores
+        if segmentation.clv is not None:
+            customers = apply_clv_model(customers, segmentation.clv)
+        cluster_model = segmentation.cluster_model
+    else:
+        customers = segment_customers(calculate_rfm_scores(customers))
+        cluster_model = load_cluster_model(data_dir)
+    customers = add_customer_features(customers)
+
+    previous, _ = load_customer_data(data_dir)
+    customers = carry_over(previous, customers, cluster_model)
+
+    stats = publish_snapshot(customers, data_dir, database=database)
+    accumulator.save(state_path)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental RFM refresh of the dashboard data")
+    parser.add_argument('transactions', help="CSV or Parquet file with the transactions to fold in")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--analysis-date', default=None)
+    parser.add_argument('--memory-mb', type=int, default=DEFAULT_MEMORY_MB)
+    parser.add_argument('--init', action='store_true',
+                        help="build the state from a full transaction history instead")
+    parser.add_argument('--database', action='store_true', default=None,
+                        help="also publish the SQLite database the dashboards query instead of "
+                             "loading every customer (kept by later refreshes)")
+    args = parser.parse_args()
+
+    if args.init:
+        accumulator = build_rfm_state(args.transactions, args.data_dir, args.memory_mb)
+        print(f"RFM state built: {len(accumulator.partials):,} customers, "
+              f"{accumulator.transactions:,} transactions")
+        return
+
+    stats = refresh_customers(args.transactions, args.data_dir, args.analysis_date, args.memory_mb,
+                              args.database)
+    print(f"Dashboard data refreshed: {stats['total_customers']:,} customers, "
+          f"${stats['total_revenue']:,.2f} revenue")
+
+
+if __name__ == "__main__":
+    main()
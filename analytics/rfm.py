@@ -0,0 +1,421 @@
+"""
+Vectorized per-customer RFM metrics from transaction rows.
+
+All metrics come from one groupby over CustomerID: the customer keys are
+hashed once and every metric is a built-in (Cython) reduction over that
+grouping, with no Python lambdas or per-customer function calls. Recency
+and Days_Since_First are computed from the last and first invoice dates
+afterwards, on one row per customer.
+
+Transaction files that do not fit in memory are streamed instead: each
+bounded chunk is folded into per-customer partial aggregates (first/last
+date, sums, line counts and a bottom-k sketch of invoice hashes), so the
+memory used depends on the chunk budget and the number of customers, not
+on the number of transactions.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics.rules import apply_rules
+from analytics.sketch import DEFAULT_SKETCH_SIZE, QuantileSummary, assign_bins, qcut_boundaries
+
+RFM_COLUMNS = ['CustomerID', 'Recency', 'Frequency', 'Monetary', 'AOV',
+               'Total_Quantity', 'Days_Since_First']
+
+# Streaming defaults: memory budget for one chunk and the number of invoice
+# hashes kept per customer (Frequency is exact up to this many invoices)
+DEFAULT_MEMORY_MB = 256
+DEFAULT_INVOICE_SKETCH = 1024
+
+# Pending chunk sketches are merged into the state once they hold at least
+# this many hashes (16 bytes each) and at least as many as the state
+FLUSH_MIN_HASHES = 1_000_000
+
+# Working memory of a chunk (groupby keys, hashes, temporaries) relative to
+# the size of its columns
+CHUNK_OVERHEAD = 4
+
+# Columns scored into quintiles (R_Score, F_Score, M_Score)
+SCORE_COLUMNS = ['Recency', 'Frequency', 'Monetary']
+
+TRANSACTION_COLUMNS = ['InvoiceNo', 'Quantity', 'InvoiceDate', 'UnitPrice', 'CustomerID']
+
+
+def calculate_rfm_metrics(df, analysis_date):
+    """
+    Calculate RFM (Recency, Frequency, Monetary) metrics for customer analysis
+
+    Parameters:
+    df: DataFrame with CustomerID, InvoiceNo, InvoiceDate, Quantity and
+        TotalAmount columns, one row per transaction line
+    analysis_date: Reference date for recency calculation
+
+    Returns:
+    DataFrame with one row per customer (sorted by CustomerID) and the
+    columns in RFM_COLUMNS
+    """
+    rfm = df.groupby('CustomerID').agg(
+        Last_Purchase=('InvoiceDate', 'max'),
+        Frequency=('InvoiceNo', 'nunique'),
+        Monetary=('TotalAmount', 'sum'),
+        AOV=('TotalAmount', 'mean'),
+        Total_Quantity=('Quantity', 'sum'),
+        First_Purchase=('InvoiceDate', 'min'),
+    )
+
+    analysis_date = pd.Timestamp(analysis_date)
+    rfm['Recency'] = (analysis_date - rfm['Last_Purchase']).dt.days
+    rfm['Days_Since_First'] = (analysis_date - rfm['First_Purchase']).dt.days
+
+    return rfm.reset_index()[RFM_COLUMNS]
+
+
+def calculate_rfm_scores(rfm_df):
+    """
+    Calculate RFM scores (1-5 scale) using quintiles
+
+    Recency is scored in reverse (more recent is better). Ties are broken
+    by rank order so every quintile holds the same number of customers.
+    """
+    rfm_df['R_Score'] = pd.qcut(rfm_df['Recency'].rank(method='first'), 5, labels=[5, 4, 3, 2, 1]).astype(int)
+    rfm_df['F_Score'] = pd.qcut(rfm_df['Frequency'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5]).astype(int)
+    rfm_df['M_Score'] = pd.qcut(rfm_df['Monetary'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5]).astype(int)
+
+    rfm_df['RFM_Score'] = rfm_df['R_Score'].astype(str) + rfm_df['F_Score'].astype(str) + rfm_df['M_Score'].astype(str)
+    rfm_df['RFM_Value'] = rfm_df['R_Score'] + rfm_df['F_Score'] + rfm_df['M_Score']
+    return rfm_df
+
+
+def _shard_summaries(shard, sketch_size):
+    """Quantile summaries of one shard's Recency, Frequency and Monetary"""
+    ties = shard['Row']
+    return {column: QuantileSummary.build(shard[column], ties, sketch_size) for column in SCORE_COLUMNS}
+
+
+def _shard_scores(shard, boundaries):
+    """R/F/M scores of one shard from the merged quintile boundaries"""
+    ties = shard['Row']
+    scores = {column: assign_bins(shard[column], ties, boundaries[column]) + 1 for column in SCORE_COLUMNS}
+    scores['Recency'] = 6 - scores['Recency']
+    return shard['Row'], scores
+
+
+def calculate_rfm_scores_sharded(rfm_df, workers=None, sketch_size=DEFAULT_SKETCH_SIZE):
+    """
+    Calculate RFM scores like calculate_rfm_scores, in parallel over shards
+
+    Customers are partitioned by a hash of CustomerID across a process pool.
+    Each worker summarizes its shard's Recency, Frequency and Monetary in a
+    mergeable quantile sketch. The merged sketches give the quintile
+    boundaries, and the workers then score their shards against them. No
+    step sorts all customers together.
+
+    Scores match the exact path for up to sketch_size customers per shard.
+    Above that, a boundary's rank is off by at most n / sketch_size, so at
+    most 8 / sketch_size of the customers (0.2% at the default 4096), all
+    of them next to a quintile boundary, get a score one step away.
+
+    Parameters:
+    workers: number of processes (default: all cores)
+    """
+    workers = workers or os.cpu_count() or 1
+    shard_ids = pd.util.hash_array(rfm_df['CustomerID'].to_numpy()) % workers
+
+    columns = {column: rfm_df[column].to_numpy(dtype='float64') for column in SCORE_COLUMNS}
+    columns['Row'] = np.arange(len(rfm_df), dtype='int64')
+    shards = [{name: values[shard_ids == shard] for name, values in columns.items()}
+              for shard in range(workers)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(_shard_summaries, shards, [sketch_size] * workers))
+        boundaries = {
+            column: qcut_boundaries(QuantileSummary.merge([s[column] for s in summaries]))
+            for column in SCORE_COLUMNS
+        }
+        scored = list(pool.map(_shard_scores, shards, [boundaries] * workers))
+
+    for column, score_column in zip(SCORE_COLUMNS, ['R_Score', 'F_Score', 'M_Score']):
+        score = np.empty(len(rfm_df), dtype='int64')
+        for rows, scores in scored:
+            score[rows] = scores[column]
+        rfm_df[score_column] = score
+
+    rfm_df['RFM_Score'] = rfm_df['R_Score'].astype(str) + rfm_df['F_Score'].astype(str) + rfm_df['M_Score'].astype(str)
+    rfm_df['RFM_Value'] = rfm_df['R_Score'] + rfm_df['F_Score'] + rfm_df['M_Score']
+    return rfm_df
+
+
+def segment_customers(df, rules=None):
+    """Segment customers by RFM_Value (Champions down to Lost Customers)"""
+    return apply_rules(df, ['Customer_Segment'], rules)
+
+
+def add_customer_features(df, rules=None):
+    """Add the R/F/M categories, order value, lifetime and purchase intensity"""
+    df = apply_rules(df, ['Recency_Category', 'Frequency_Category', 'Monetary_Category'], rules)
+
+    df['Avg_Order_Value'] = (df['Monetary'] / df['Frequency']).fillna(0)
+
+    # Customer lifetime estimate (frequency * 30 + recency)
+    df['Customer_Lifetime'] = df['Frequency'] * 30 + df['Recency']
+    df['Purchase_Intensity'] = (df['Frequency'] / (df['Customer_Lifetime'] / 365)).replace([np.inf, -np.inf], 0).fillna(0)
+    return df
+
+
+def purchase_transactions(chunk):
+    """Purchase lines with a CustomerID, with TotalAmount filled in"""
+    chunk = chunk[chunk['CustomerID'].notna() & (chunk['Quantity'] > 0)]
+    if 'TotalAmount' not in chunk.columns:
+        chunk = chunk.assign(TotalAmount=chunk['Quantity'] * chunk['UnitPrice'])
+    return chunk
+
+
+def chunk_rows(memory_mb, sample):
+    """Rows per chunk that keep one chunk's working set within memory_mb"""
+    bytes_per_row = sample.memory_usage(deep=True, index=False).sum() / max(len(sample), 1)
+    return max(1_000, int(memory_mb * 1024**2 / (bytes_per_row * CHUNK_OVERHEAD)))
+
+
+def read_transaction_chunks(path, memory_mb=DEFAULT_MEMORY_MB):
+    """
+    Stream a CSV or Parquet transaction file in chunks sized to memory_mb
+
+    Only the columns RFM needs are read. Yields DataFrames with InvoiceDate
+    parsed and InvoiceNo as strings.
+    """
+    path = Path(path)
+
+    if path.suffix == '.parquet':
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        columns = [c for c in TRANSACTION_COLUMNS + ['TotalAmount'] if c in parquet.schema_arrow.names]
+        sample = next(parquet.iter_batches(batch_size=10_000, columns=columns)).to_pandas()
+        for batch in parquet.iter_batches(batch_size=chunk_rows(memory_mb, sample), columns=columns):
+            chunk = batch.to_pandas()
+            chunk['InvoiceNo'] = chunk['InvoiceNo'].astype(str)
+            yield chunk
+        return
+
+    header = pd.read_csv(path, nrows=0).columns
+    options = {
+        'usecols': [c for c in TRANSACTION_COLUMNS + ['TotalAmount'] if c in header],
+        'dtype': {'InvoiceNo': str},
+        'parse_dates': ['InvoiceDate'],
+    }
+    sample = pd.read_csv(path, nrows=10_000, **options)
+    yield from pd.read_csv(path, chunksize=chunk_rows(memory_mb, sample), **options)
+
+
+class RfmAccumulator:
+    """
+    Per-customer partial RFM aggregates, folded in one chunk at a time
+
+    Each partial is mergeable: dates by min/max, amounts, quantities and line
+    counts by sum. Distinct invoices are tracked as the `invoice_sketch` + 1
+    smallest 64-bit invoice hashes per customer (a bottom-k sketch plus one
+    hash that marks an overflow), so Frequency is exact for customers with
+    up to `invoice_sketch` invoices and an unbiased estimate above it.
+
+    Each chunk is reduced to its own partials and sketches, which are merged
+    into the state in one pass once they hold as many hashes as the state
+    (and before the state is read or saved), so a pass over many chunks does
+    not re-merge every customer for each chunk. The state can be saved and
+    loaded, so new transactions can be added later without reading the
+    history again.
+    """
+
+    def __init__(self, invoice_sketch=DEFAULT_INVOICE_SKETCH):
+        self.invoice_sketch = invoice_sketch
+        self.transactions = 0
+        self._partials = None
+        self._invoices = None
+        self._pending = []
+        self._pending_hashes = 0
+
+    @property
+    def partials(self):
+        """Per-customer partial aggregates (sorted by CustomerID), with pending chunks merged"""
+        self.flush()
+        return self._partials
+
+    @property
+    def invoices(self):
+        """(customers, hashes) arrays of the invoice sketches, with pending chunks merged"""
+        self.flush()
+        return self._invoices
+
+    def add(self, chunk):
+        """Fold a chunk of purchase transactions into the partial aggregates"""
+        self.transactions += len(chunk)
+
+        partial = chunk.groupby('CustomerID').agg(
+            Last_Purchase=('InvoiceDate', 'max'),
+            First_Purchase=('InvoiceDate', 'min'),
+            Monetary=('TotalAmount', 'sum'),
+            Lines=('TotalAmount', 'count'),
+            Total_Quantity=('Quantity', 'sum'),
+        )
+        customers = chunk['CustomerID'].to_numpy(dtype='float64')
+        hashes = pd.util.hash_pandas_object(chunk['InvoiceNo'].astype(str), index=False).to_numpy()
+        customers, hashes = self._bottom_k(customers, hashes)
+
+        self._pending.append((partial, customers, hashes))
+        self._pending_hashes += len(hashes)
+        state_hashes = 0 if self._invoices is None else len(self._invoices[1])
+        if self._pending_hashes >= max(state_hashes, FLUSH_MIN_HASHES):
+            self.flush()
+
+    def _bottom_k(self, customers, hashes):
+        """Distinct (customer, hash) pairs, keeping the invoice_sketch + 1 smallest hashes per customer"""
+        order = np.lexsort((hashes, customers))
+        customers, hashes = customers[order], hashes[order]
+        distinct = np.ones(len(customers), dtype=bool)
+        distinct[1:] = (customers[1:] != customers[:-1]) | (hashes[1:] != hashes[:-1])
+        customers, hashes = customers[distinct], hashes[distinct]
+
+        positions = np.arange(len(customers))
+        starts = np.ones(len(customers), dtype=bool)
+        starts[1:] = customers[1:] != customers[:-1]
+        rank = positions - np.maximum.accumulate(np.where(starts, positions, 0))
+        keep = rank <= self.invoice_sketch
+        return customers[keep], hashes[keep]
+
+    def flush(self):
+        """Merge the chunks added since the last flush into the state"""
+        if not self._pending:
+            return
+        partials = [partial for partial, _, _ in self._pending]
+        customers = [pending_customers for _, pending_customers, _ in self._pending]
+        hashes = [pending_hashes for _, _, pending_hashes in self._pending]
+        if self._partials is not None:
+            partials.insert(0, self._partials.drop(columns=['Invoices', 'Kth_Hash']))
+            customers.insert(0, self._invoices[0])
+            hashes.insert(0, self._invoices[1])
+        self._pending = []
+        self._pending_hashes = 0
+
+        merged = pd.concat(partials).groupby(level=0).agg({
+            'Last_Purchase': 'max',
+            'First_Purchase': 'min',
+            'Monetary': 'sum',
+            'Lines': 'sum',
+            'Total_Quantity': 'sum',
+        })
+        customers, hashes = self._bottom_k(np.concatenate(customers), np.concatenate(hashes))
+
+        # Hashes kept per customer (invoice_sketch + 1 means the sketch
+        # overflowed) and the invoice_sketch-th smallest of them
+        unique, first, kept = np.unique(customers, return_index=True, return_counts=True)
+        kth = hashes[first + np.minimum(kept, self.invoice_sketch) - 1]
+        merged['Invoices'] = pd.Series(kept, index=unique).reindex(merged.index, fill_value=0).to_numpy()
+        merged['Kth_Hash'] = pd.Series(kth, index=unique).reindex(merged.index, fill_value=0).to_numpy()
+
+        self._partials = merged
+        self._invoices = (customers, hashes)
+
+    def frequency(self):
+        """Distinct invoices per customer, estimated past the sketch size"""
+        partials = self.partials
+        kept = partials['Invoices'].to_numpy()
+        frequency = kept.astype('float64')
+
+        # Only customers with more hashes than the sketch size have more invoices than it
+        full = kept > self.invoice_sketch
+        if full.any():
+            # Bottom-k estimate: (k - 1) / (k-th smallest hash as a fraction of the hash space)
+            kth = partials['Kth_Hash'].to_numpy()[full].astype('float64') / 2.0**64
+            frequency[full] = np.maximum((self.invoice_sketch - 1) / kth, self.invoice_sketch + 1)
+        return pd.Series(np.round(frequency).astype('int64'), index=partials.index)
+
+    def save(self, path):
+        """Write the state to an .npz file (via a temporary file and a rename)"""
+        path = Path(path)
+        arrays = {f"partial_{column}": self.partials[column].to_numpy() for column in self.partials.columns}
+
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, customer_id=self.partials.index.to_numpy(),
+                     invoice_customers=self.invoices[0], invoice_hashes=self.invoices[1],
+                     invoice_sketch=self.invoice_sketch, transactions=self.transactions, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a state written by save()"""
+        with np.load(path, allow_pickle=False) as saved:
+            accumulator = cls(int(saved['invoice_sketch']))
+            accumulator.transactions = int(saved['transactions'])
+            accumulator._invoices = (saved['invoice_customers'], saved['invoice_hashes'])
+            columns = {key[len('partial_'):]: saved[key] for key in saved.files if key.startswith('partial_')}
+            accumulator._partials = pd.DataFrame(columns, index=pd.Index(saved['customer_id'], name='CustomerID'))
+        return accumulator
+
+    def result(self, analysis_date=None):
+        """
+        RFM frame from the folded partials, in the calculate_rfm_metrics layout
+
+        Parameters:
+        analysis_date: Reference date for recency; defaults to the day after
+                       the last purchase seen, as in the notebook
+        """
+        partials = self.partials
+        if analysis_date is None:
+            analysis_date = partials['Last_Purchase'].max() + pd.Timedelta(days=1)
+        analysis_date = pd.Timestamp(analysis_date)
+
+        rfm = pd.DataFrame({
+            'Recency': (analysis_date - partials['Last_Purchase']).dt.days,
+            'Frequency': self.frequency(),
+            'Monetary': partials['Monetary'],
+            'AOV': partials['Monetary'] / partials['Lines'],
+            'Total_Quantity': partials['Total_Quantity'],
+            'Days_Since_First': (analysis_date - partials['First_Purchase']).dt.days,
+        })
+        rfm.index.name = 'CustomerID'
+        return rfm.reset_index()[RFM_COLUMNS]
+
+
+def transaction_chunks(source, memory_mb=DEFAULT_MEMORY_MB):
+    """Chunks of a path (CSV or Parquet), a DataFrame or an iterable of DataFrames"""
+    if isinstance(source, (str, Path)):
+        return read_transaction_chunks(source, memory_mb)
+    if isinstance(source, pd.DataFrame):
+        return [source]
+    return source
+
+
+def fold_transactions(source, accumulator=None, memory_mb=DEFAULT_MEMORY_MB,
+                      invoice_sketch=DEFAULT_INVOICE_SKETCH):
+    """Fold the purchase transactions of a source into an RfmAccumulator"""
+    if accumulator is None:
+        accumulator = RfmAccumulator(invoice_sketch)
+    for chunk in transaction_chunks(source, memory_mb):
+        accumulator.add(purchase_transactions(chunk))
+    return accumulator
+
+
+def stream_rfm_metrics(source, analysis_date=None, memory_mb=DEFAULT_MEMORY_MB,
+                       invoice_sketch=DEFAULT_INVOICE_SKETCH):
+    """
+    Calculate RFM metrics without loading the whole transaction history
+
+    Parameters:
+    source: path to a CSV or Parquet transaction file, a DataFrame or an
+            iterable of transaction DataFrames
+    analysis_date: Reference date for recency (default: day after the last
+                   purchase)
+    memory_mb: memory budget for one chunk when reading from a file
+    invoice_sketch: invoice hashes kept per customer for Frequency
+
+    Returns:
+    The same per-customer frame as calculate_rfm_metrics on the purchase
+    transactions (AOV and Monetary may differ in the last float digits)
+    """
+    accumulator = fold_transactions(source, memory_mb=memory_mb, invoice_sketch=invoice_sketch)
+    return accumulator.result(analysis_date)
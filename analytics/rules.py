@@ -0,0 +1,107 @@
+"""
+Declarative segmentation rules compiled to vectorized lookups.
+
+Each rule set in rules.json assigns one output column from one input
+column, either through a threshold table (`bins` edges with a label per
+interval, like pd.cut) or through a value table (`values` mapping with a
+`default`). A threshold table compiles to a single np.searchsorted over
+the edges and a value table to a factorize plus one array lookup, so a
+rule set costs one pass over the rows however many labels it has.
+
+Rules are edited in the JSON file; load_rules() also accepts another file.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RULES_FILE = Path(__file__).resolve().parent / 'rules.json'
+
+
+class RuleSet:
+    """One compiled rule set: an input column, its table and the labels"""
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.spec = spec
+        self.column = spec['column']
+        self.labels = spec.get('labels')
+        self.ordered = spec.get('ordered', False)
+        self.missing = spec.get('missing')
+
+        if 'bins' in spec:
+            edges = [(-np.inf if i == 0 else np.inf) if edge is None else edge
+                     for i, edge in enumerate(spec['bins'])]
+            if len(self.labels) != len(edges) - 1:
+                raise ValueError(f"Rule set '{name}' needs one label per bin")
+            self.edges = np.asarray(edges, dtype='float64')
+            # Right-closed bins (a, b] take the left insertion point
+            self.side = 'left' if spec.get('closed', 'right') == 'right' else 'right'
+            self.values = None
+        else:
+            self.edges = None
+            self.values = spec['values']
+            self.default = spec.get('default')
+            self.labels = list(dict.fromkeys(list(self.values.values()) + [self.default]))
+
+        if self.missing is not None and self.missing['label'] not in self.labels:
+            self.labels = self.labels + [self.missing['label']]
+
+    def codes(self, df):
+        """Label index of each row, -1 where no rule matches"""
+        values = df[self.column]
+
+        if self.edges is not None:
+            numeric = values.to_numpy(dtype='float64', na_value=np.nan)
+            codes = np.searchsorted(self.edges, numeric, side=self.side) - 1
+            codes[(codes >= len(self.edges) - 1) | np.isnan(numeric)] = -1
+        else:
+            # Look up each distinct value once; missing values (code -1) take the default
+            keys, uniques = pd.factorize(values)
+            matched = [self.values.get(key, self.default) for key in uniques] + [self.default]
+            lookup = np.array([-1 if label is None else self.labels.index(label) for label in matched])
+            codes = lookup[keys]
+
+        if self.missing is not None:
+            codes = np.where(df[self.missing['column']].isna().to_numpy(),
+                             self.labels.index(self.missing['label']), codes)
+        return codes
+
+    def apply(self, df):
+        """
+        Labels for every row of df
+
+        Returns:
+        Categorical Series for text labels, float Series for numeric labels;
+        rows outside every bin are missing
+        """
+        codes = self.codes(df)
+        if all(isinstance(label, (int, float)) for label in self.labels):
+            labels = np.append(np.asarray(self.labels, dtype='float64'), np.nan)
+            return pd.Series(labels[codes], index=df.index, name=self.name)
+
+        categories = pd.Categorical.from_codes(codes, categories=self.labels, ordered=self.ordered)
+        return pd.Series(categories, index=df.index, name=self.name)
+
+
+def load_rules(path=RULES_FILE):
+    """Compile every rule set of a rules file, keyed by output column"""
+    with open(path, 'r') as f:
+        specs = json.load(f)
+    return {name: RuleSet(name, spec) for name, spec in specs.items()}
+
+
+def apply_rules(df, names, rules=None):
+    """
+    Assign the output columns of the named rule sets to df
+
+    Parameters:
+    names: output columns to assign, in order
+    rules: compiled rules (default: the rules.json shipped with the package)
+    """
+    rules = rules or load_rules()
+    for name in names:
+        df[name] = rules[name].apply(df)
+    return df
@@ -0,0 +1,34 @@
+"""
+Row samples that keep every group represented.
+
+A uniform sample of a few thousand rows can miss a small cluster or
+segment entirely. stratified_sample draws each group in proportion to its
+size, with a floor of two rows, so the cluster selection's silhouette
+scores and the sampled scatter charts still see the small groups.
+"""
+
+import numpy as np
+
+
+def stratified_sample(labels, size, rng):
+    """
+    Row indices of a sample with each group in proportion to its size
+
+    Parameters:
+    labels: group label (or code) of each row
+    size: approximate sample size
+    rng: numpy Generator
+
+    Returns:
+    Row indices, grouped by label; every group gets at least two rows (when
+    it has them)
+    """
+    groups, counts = np.unique(labels, return_counts=True)
+    quotas = np.maximum(np.round(counts / counts.sum() * size).astype('int64'), 2)
+    quotas = np.minimum(quotas, counts)
+
+    rows = []
+    for group, quota in zip(groups, quotas):
+        members = np.flatnonzero(labels == group)
+        rows.append(rng.choice(members, size=quota, replace=False))
+    return np.concatenate(rows)
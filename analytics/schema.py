@@ -0,0 +1,132 @@
+"""
+Declared in-memory schema for the customer analytics frame.
+
+Labels are stored as categoricals, IDs and counts as 32-bit (or smaller)
+integers, 1-5 scores as int8 and derived ratios as float32. Monetary stays
+float64 because revenue totals are shown to the cent.
+"""
+
+import numpy as np
+import pandas as pd
+
+SEGMENTS = ['Champions', 'Loyal Customers', 'Potential Loyalists', 'At Risk',
+            'Cannot Lose Them', 'Lost Customers']
+CLUSTER_NAMES = ['VIP Customers', 'Regular Customers', 'Occasional Customers', 'At-Risk Customers']
+CLV_SEGMENTS = ['Diamond', 'Platinum', 'Gold', 'Silver', 'Bronze']
+RFM_SCORES = [f"{r}{f}{m}" for r in range(1, 6) for f in range(1, 6) for m in range(1, 6)]
+
+# Categorical columns: (categories, ordered)
+CATEGORICAL_COLUMNS = {
+    'Customer_Segment': (SEGMENTS, False),
+    'Cluster_Name': (CLUSTER_NAMES, False),
+    'Recency_Category': (['Very_Recent', 'Recent', 'Moderate', 'Old', 'Very_Old'], True),
+    'Frequency_Category': (['Low', 'Medium', 'High', 'Very_High', 'Exceptional'], True),
+    'Monetary_Category': (['Low_Value', 'Medium_Value', 'High_Value', 'Premium', 'VIP'], True),
+    'CLV_Segment': (CLV_SEGMENTS, False),
+    'RFM_Score': (RFM_SCORES, False),
+}
+
+NUMERIC_COLUMNS = {
+    'CustomerID': 'int32',
+    'Recency': 'int16',
+    'Frequency': 'int32',
+    'Monetary': 'float64',
+    'AOV': 'float32',
+    'Total_Quantity': 'int32',
+    'Days_Since_First': 'int16',
+    'R_Score': 'int8',
+    'F_Score': 'int8',
+    'M_Score': 'int8',
+    'RFM_Value': 'int8',
+    'Cluster': 'int8',
+    'KMeans_Cluster': 'int8',
+    'Avg_Order_Value': 'float32',
+    'Customer_Lifetime': 'int32',
+    'Purchase_Intensity': 'float32',
+    'CLV_Predictive': 'float32',
+}
+
+
+def frame_memory_mb(df):
+    """Resident memory of a frame in MB, including string payloads"""
+    return df.memory_usage(deep=True).sum() / 1024**2
+
+
+def _to_categorical(series, categories, ordered):
+    """Cast to the declared categories, keeping any undeclared values"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if list(series.cat.categories) == categories and series.cat.ordered == ordered:
+            return series
+        if set(series.cat.categories) <= set(categories):
+            # Recode in place of casting through strings (e.g. rule engine output)
+            return series.cat.set_categories(categories, ordered=ordered)
+    if pd.api.types.is_numeric_dtype(series):
+        # e.g. RFM_Score parsed from CSV as 445 instead of '445'
+        series = series.astype('Int64').astype(str)
+
+    extra = sorted(set(series.dropna().unique()) - set(categories))
+    dtype = pd.CategoricalDtype(categories + [str(v) for v in extra], ordered=ordered)
+    return series.astype(str).where(series.notna()).astype(dtype)
+
+
+def _fits(series, dtype):
+    """Whether every value of a numeric column is representable in dtype"""
+    dtype = np.dtype(dtype)
+    values = series.to_numpy()
+    if dtype.kind == 'f':
+        values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return True
+    if dtype.kind in 'iu':
+        if values.dtype.kind == 'f' and not np.array_equal(values, np.floor(values)):
+            return False
+        info = np.iinfo(dtype)
+    else:
+        info = np.finfo(dtype)
+    return info.min <= values.min() and values.max() <= info.max
+
+
+def _to_numeric(series, dtype):
+    """
+    Cast a numeric column, leaving it untouched if it has missing values or
+    values the declared dtype cannot hold (out of range, or fractional for
+    an integer dtype)
+    """
+    if series.dtype == dtype or series.isna().any():
+        return series
+    if pd.api.types.is_numeric_dtype(series) and not _fits(series, dtype):
+        return series
+    return series.astype(dtype)
+
+
+def apply_schema(df):
+    """
+    Apply the declared schema to the customer frame
+
+    Columns that are not declared are left as they are.
+
+    Returns:
+    (df, report) where report holds the frame memory before and after in MB
+    """
+    before_mb = frame_memory_mb(df)
+
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if column in CATEGORICAL_COLUMNS:
+            categories, ordered = CATEGORICAL_COLUMNS[column]
+            series = _to_categorical(series, categories, ordered)
+        elif column in NUMERIC_COLUMNS:
+            series = _to_numeric(series, NUMERIC_COLUMNS[column])
+        columns[column] = series
+
+    # copy=False keeps columns that already match the schema as views
+    typed = pd.DataFrame(columns, index=df.index, copy=False)
+    after_mb = frame_memory_mb(typed)
+
+    report = {
+        'before_mb': round(float(before_mb), 2),
+        'after_mb': round(float(after_mb), 2),
+        'reduction': round(float(before_mb / after_mb), 1) if after_mb else None,
+    }
+    return typed, report
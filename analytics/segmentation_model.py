@@ -0,0 +1,174 @@
+"""
+Versioned segmentation model for assigning customers without refitting.
+
+The notebook fits the feature scaling and K-Means centroids, scores R/F/M
+into quintiles and segments customers by their RFM value. This module saves
+all of it as one JSON artifact: the cluster model, the quintile boundaries
+of Recency, Frequency and Monetary (as the largest value of each of the
+four lower quintiles), the segment rule set and, when CLV was scored, the
+CLV model parameters and tier thresholds. Each save is a new version
+under data/models/, so labels can always be traced back to the model that
+produced them.
+
+SegmentationModel.assign scores any batch of customers against the
+artifact in fixed-size chunks: a searchsorted per score column, the
+compiled segment rule and a nearest-centroid lookup. Nothing is refitted
+or ranked, so the cost is proportional to the number of customers
+assigned, and a customer with the same R/F/M gets the same scores,
+segment and cluster on any day.
+
+Customers whose value equals a quintile boundary get the lower score
+(the notebook's rank-based quintiles can split ties across two scores).
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics.clustering import BATCH_ROWS, ClusterModel
+from analytics.rules import RuleSet, load_rules
+from analytics.snapshot import DATA_DIR
+
+MODELS_DIR = 'models'
+MODEL_PREFIX = 'segmentation-'
+FORMAT_VERSION = 1
+
+SCORE_NAMES = {'Recency': 'R_Score', 'Frequency': 'F_Score', 'Monetary': 'M_Score'}
+
+
+def quintile_edges(df):
+    """
+    Largest value of each of the four lower quintiles, per scored column
+
+    Parameters:
+    df: customers scored by calculate_rfm_scores (R_Score counts down)
+    """
+    edges = {}
+    for column, score_column in SCORE_NAMES.items():
+        quintile = df[score_column].to_numpy()
+        if column == 'Recency':
+            quintile = 6 - quintile
+        edges[column] = df[column].groupby(quintile).max().sort_index().to_numpy()[:-1].tolist()
+    return edges
+
+
+class SegmentationModel:
+    """Cluster model, quintile boundaries, segment rule and CLV model of one notebook run"""
+
+    def __init__(self, cluster_model, score_edges, segment_rule, clv=None, version=None, created_at=None):
+        self.cluster_model = cluster_model
+        self.score_edges = {column: np.asarray(edges, dtype='float64') for column, edges in score_edges.items()}
+        self.segment_rule = segment_rule
+        self.clv = clv
+        created = datetime.now()
+        self.version = version or created.strftime('%Y%m%d%H%M%S')
+        self.created_at = created_at or created.isoformat(timespec='seconds')
+
+    @classmethod
+    def fit(cls, customers, cluster_model, rules=None, clv=None):
+        """
+        Capture the model behind a scored and segmented customer frame
+
+        Parameters:
+        customers: frame with Recency/Frequency/Monetary and their scores
+        cluster_model: ClusterModel the customers were clustered with
+        rules: compiled rules the segments came from (default: rules.json)
+        clv: CLV model returned by analytics.clv.score_clv
+        """
+        rules = rules or load_rules()
+        return cls(cluster_model, quintile_edges(customers), rules['Customer_Segment'], clv)
+
+    def _assign_chunk(self, chunk, clusters):
+        assigned = pd.DataFrame(index=chunk.index)
+        for column, score_column in SCORE_NAMES.items():
+            values = chunk[column].to_numpy(dtype='float64')
+            quintile = np.searchsorted(self.score_edges[column], values, side='left') + 1
+            assigned[score_column] = 6 - quintile if column == 'Recency' else quintile
+
+        assigned['RFM_Score'] = (assigned['R_Score'].astype(str) + assigned['F_Score'].astype(str)
+                                 + assigned['M_Score'].astype(str))
+        assigned['RFM_Value'] = assigned['R_Score'] + assigned['F_Score'] + assigned['M_Score']
+        assigned[self.segment_rule.name] = self.segment_rule.apply(assigned)
+
+        if clusters:
+            cluster = self.cluster_model.predict(chunk).astype('int64')
+            assigned['Cluster'] = cluster
+            assigned['Cluster_Name'] = np.asarray(self.cluster_model.names, dtype=object)[cluster]
+        return assigned
+
+    def assign(self, customers, clusters=True, batch_rows=BATCH_ROWS):
+        """
+        Scores, segment and (optionally) cluster of each customer
+
+        Parameters:
+        customers: frame with Recency, Frequency and Monetary
+        clusters: also assign Cluster and Cluster_Name
+
+        Returns:
+        DataFrame indexed like customers with R_Score, F_Score, M_Score,
+        RFM_Score, RFM_Value, Customer_Segment (and Cluster, Cluster_Name)
+        """
+        chunks = [self._assign_chunk(customers.iloc[start:start + batch_rows], clusters)
+                  for start in range(0, len(customers), batch_rows)]
+        if not chunks:
+            return self._assign_chunk(customers, clusters)
+        return pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+
+    def to_dict(self):
+        return {
+            'format_version': FORMAT_VERSION,
+            'version': self.version,
+            'created_at': self.created_at,
+            'cluster_model': self.cluster_model.to_dict(),
+            'score_edges': {column: edges.tolist() for column, edges in self.score_edges.items()},
+            'segment_rule': {'name': self.segment_rule.name, 'spec': self.segment_rule.spec},
+            'clv': self.clv,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported segmentation model format {data['format_version']}")
+        rule = data['segment_rule']
+        return cls(ClusterModel.from_dict(data['cluster_model']), data['score_edges'],
+                   RuleSet(rule['name'], rule['spec']), data.get('clv'), data['version'], data['created_at'])
+
+    def save(self, data_dir=DATA_DIR):
+        """Write this version under data_dir/models (via a temporary file and a rename)"""
+        models_dir = Path(data_dir) / MODELS_DIR
+        models_dir.mkdir(parents=True, exist_ok=True)
+        path = models_dir / f"{MODEL_PREFIX}{self.version}.json"
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+
+def model_versions(data_dir=DATA_DIR):
+    """Saved model versions, oldest first"""
+    models_dir = Path(data_dir) / MODELS_DIR
+    return sorted(path.stem[len(MODEL_PREFIX):] for path in models_dir.glob(f"{MODEL_PREFIX}*.json"))
+
+
+def load_segmentation_model(data_dir=DATA_DIR, version=None):
+    """
+    A saved segmentation model, or None if none has been saved
+
+    Parameters:
+    version: version to load (default: the latest)
+    """
+    versions = model_versions(data_dir)
+    if not versions:
+        return None
+    version = version or versions[-1]
+    return SegmentationModel.load(Path(data_dir) / MODELS_DIR / f"{MODEL_PREFIX}{version}.json")
@@ -0,0 +1,87 @@
+"""
+Mergeable quantile summaries for sharded RFM scoring.
+
+A summary keeps a fixed number of points from a sorted shard, each carrying
+the number of values it stands for, so it is exact for shards of up to
+`size` values and otherwise within size/n of the true rank. Summaries of
+different shards merge by concatenation; ranks (and so quantiles) of the
+merged summary are within n/size of the exact ones, where n is the total
+number of values.
+
+Points are (value, tie) pairs ordered lexicographically. Passing each
+row's position as the tie reproduces rank(method='first'), which breaks
+ties in row order.
+"""
+
+import numpy as np
+
+DEFAULT_SKETCH_SIZE = 4096
+
+
+class QuantileSummary:
+    """Weighted (value, tie) points summarizing a set of values"""
+
+    def __init__(self, values, ties, weights):
+        self.values = values
+        self.ties = ties
+        self.weights = weights
+
+    @classmethod
+    def build(cls, values, ties, size=DEFAULT_SKETCH_SIZE):
+        """
+        Summarize values with at most `size` points
+
+        The sorted values are split into `size` equal blocks and each block is
+        represented by its last point, weighted by the block length.
+        """
+        order = np.lexsort((ties, values))
+        values, ties = values[order], ties[order]
+        n = len(values)
+        if n <= size:
+            return cls(values, ties, np.ones(n, dtype='int64'))
+
+        ends = np.linspace(0, n, size + 1).astype('int64')[1:]
+        weights = np.diff(ends, prepend=0)
+        return cls(values[ends - 1], ties[ends - 1], weights)
+
+    @classmethod
+    def merge(cls, summaries):
+        """Summary of the union of the summarized values"""
+        return cls(np.concatenate([s.values for s in summaries]),
+                   np.concatenate([s.ties for s in summaries]),
+                   np.concatenate([s.weights for s in summaries]))
+
+    @property
+    def count(self):
+        return int(self.weights.sum())
+
+    def at_ranks(self, ranks):
+        """(value, tie) of the points at the given 1-based ranks"""
+        order = np.lexsort((self.ties, self.values))
+        cumulative = np.cumsum(self.weights[order])
+        positions = np.searchsorted(cumulative, ranks, side='left')
+        positions = np.minimum(positions, len(order) - 1)
+        return self.values[order][positions], self.ties[order][positions]
+
+
+def qcut_boundaries(summary, bins=5):
+    """
+    Bin boundaries matching pd.qcut(rank(method='first'), bins)
+
+    qcut places its edges at the rank quantiles 1 + p * (n - 1); a value
+    falls in the bin above an edge when its rank is strictly greater.
+
+    Returns:
+    (values, ties) of the bins - 1 inner boundaries
+    """
+    n = summary.count
+    edges = 1 + np.linspace(0, 1, bins + 1)[1:-1] * (n - 1)
+    return summary.at_ranks(np.floor(edges).astype('int64'))
+
+
+def assign_bins(values, ties, boundaries):
+    """0-based bin of each (value, tie) point given the inner boundaries"""
+    bins = np.zeros(len(values), dtype='int8')
+    for boundary_value, boundary_tie in zip(*boundaries):
+        bins += (values > boundary_value) | ((values == boundary_value) & (ties > boundary_tie))
+    return bins
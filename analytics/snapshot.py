@@ -0,0 +1,291 @@
+"""
+Columnar snapshot store for the dashboard customer frame.
+
+The notebook publishes the customer frame as an Arrow IPC file with the
+dashboard statistics embedded in the schema metadata. The dashboards read it
+through a memory map, so a cold load does no parsing or type inference. The
+CSV and JSON files are still written next to it and used as a fallback.
+On request, a SQLite copy of the frame is published too (see
+analytics.database), which the dashboards query instead of loading the
+customer rows.
+
+A publish ends by writing a manifest: a version (hash of the files'
+contents), the build timestamp and the hash of every published file. The
+dashboards watch it to pick up a new version without a restart, and check
+the files against it so a CSV or statistics file rewritten on its own is
+reported as drift instead of being served next to the other's data.
+
+The loaded frame is meant to be shared read-only by every Streamlit session;
+pandas Copy-on-Write is enabled so that any code path that modifies a view
+of it copies only the columns it touches.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from analytics.schema import apply_schema
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+CSV_FILE = 'customer_analytics_data.csv'
+STATS_FILE = 'dashboard_stats.json'
+SNAPSHOT_FILE = 'customer_analytics.arrow'
+DATABASE_FILE = 'customer_analytics.db'
+MANIFEST_FILE = 'manifest.json'
+
+STATS_METADATA_KEY = b'dashboard_stats'
+
+
+def enable_copy_on_write():
+    """Turn on pandas Copy-on-Write (always on from pandas 3.0)"""
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+
+def build_dashboard_stats(df):
+    """Build the dashboard statistics dictionary from the customer frame"""
+    stats = {
+        'total_customers': int(len(df)),
+        'total_revenue': float(df['Monetary'].sum()),
+        'avg_revenue_per_customer': float(df['Monetary'].mean()),
+        'avg_recency': float(df['Recency'].mean()),
+        'avg_frequency': float(df['Frequency'].mean()),
+        'avg_monetary': float(df['Monetary'].mean())
+    }
+
+    segment_distribution = df['Customer_Segment'].value_counts().to_dict()
+    stats['segment_distribution'] = {str(k): int(v) for k, v in segment_distribution.items() if v}
+
+    cluster_distribution = df['Cluster_Name'].value_counts().to_dict()
+    stats['cluster_distribution'] = {str(k): int(v) for k, v in cluster_distribution.items() if v}
+
+    revenue_by_segment = df.groupby('Customer_Segment', observed=True)['Monetary'].sum().to_dict()
+    stats['revenue_by_segment'] = {str(k): float(v) for k, v in revenue_by_segment.items()}
+
+    top_customers = df.nlargest(10, 'Monetary')[['CustomerID', 'Monetary', 'Customer_Segment']]
+    stats['top_customers'] = [
+        {'CustomerID': float(row.CustomerID), 'Monetary': float(row.Monetary),
+         'Customer_Segment': str(row.Customer_Segment)}
+        for row in top_customers.itertuples(index=False)
+    ]
+
+    return stats
+
+
+def write_snapshot(df, stats, path):
+    """
+    Write the customer frame as an Arrow IPC file with embedded statistics
+
+    The file is written uncompressed so readers can memory-map it and use the
+    column buffers in place. It is written to a temporary file first and then
+    renamed, so a reader never sees a half-written snapshot.
+    """
+    import pyarrow as pa
+
+    path = Path(path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[STATS_METADATA_KEY] = json.dumps(stats).encode('utf-8')
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    with pa.OSFile(str(tmp_path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """
+    Memory-map an Arrow IPC snapshot and return (df, stats)
+
+    Columns are converted without consolidating them into 2D blocks, so
+    numeric columns without nulls stay read-only views over the mapped file.
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(str(path), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    stats = json.loads(table.schema.metadata[STATS_METADATA_KEY])
+    return table.to_pandas(split_blocks=True), stats
+
+
+def read_csv_data(data_dir=DATA_DIR):
+    """Read the CSV and JSON exports and return (df, stats)"""
+    data_dir = Path(data_dir)
+    df = pd.read_csv(data_dir / CSV_FILE)
+
+    with open(data_dir / STATS_FILE, 'r') as f:
+        stats = json.load(f)
+
+    return df, stats
+
+
+def snapshot_is_current(data_dir=DATA_DIR):
+    """Check that the snapshot exists and is not older than the CSV export"""
+    data_dir = Path(data_dir)
+    snapshot_path = data_dir / SNAPSHOT_FILE
+    csv_path = data_dir / CSV_FILE
+
+    if not snapshot_path.exists():
+        return False
+    if not csv_path.exists():
+        return True
+    return snapshot_path.stat().st_mtime >= csv_path.stat().st_mtime
+
+
+def database_is_current(data_dir=DATA_DIR):
+    """Check that the SQLite database exists and is not older than the CSV export"""
+    data_dir = Path(data_dir)
+    database_path = data_dir / DATABASE_FILE
+    csv_path = data_dir / CSV_FILE
+
+    if not database_path.exists():
+        return False
+    if not csv_path.exists():
+        return True
+    return database_path.stat().st_mtime >= csv_path.stat().st_mtime
+
+
+def load_customer_data(data_dir=DATA_DIR):
+    """
+    Load the customer frame and dashboard statistics
+
+    Reads the memory-mapped snapshot when it is current, otherwise falls back
+    to parsing the CSV export (also used when pyarrow is not installed). The
+    declared schema is applied on every load; the memory report is kept in
+    df.attrs['memory_usage'].
+
+    Returns:
+    (df, stats) tuple
+    """
+    enable_copy_on_write()
+
+    df = stats = None
+    if snapshot_is_current(data_dir):
+        try:
+            df, stats = read_snapshot(Path(data_dir) / SNAPSHOT_FILE)
+        except ImportError:
+            pass
+
+    if df is None:
+        df, stats = read_csv_data(data_dir)
+
+    df, report = apply_schema(df)
+    df.attrs['memory_usage'] = report
+    return df, stats
+
+
+def publish_snapshot(df, data_dir=DATA_DIR, stats=None, database=False):
+    """
+    Publish the customer frame for the dashboards
+
+    Writes the CSV and JSON exports and, when pyarrow is available, the
+    columnar snapshot with the declared schema applied. With database=True
+    it also writes the SQLite database the dashboards then query. Returns
+    the statistics that were written.
+    """
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    df, _ = apply_schema(df)
+
+    if stats is None:
+        stats = build_dashboard_stats(df)
+
+    df.to_csv(data_dir / CSV_FILE, index=False)
+    with open(data_dir / STATS_FILE, 'w') as f:
+        json.dump(stats, f, indent=2)
+
+    files = [CSV_FILE, STATS_FILE]
+    try:
+        write_snapshot(df, stats, data_dir / SNAPSHOT_FILE)
+        files.append(SNAPSHOT_FILE)
+    except ImportError:
+        pass
+
+    if database:
+        from analytics.database import write_database
+
+        write_database(df, data_dir / DATABASE_FILE)
+        files.append(DATABASE_FILE)
+
+    # Last, so the new version is announced only once every file is in place
+    write_manifest(data_dir, files, rows=len(df))
+    return stats
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_manifest(data_dir, files, rows=None):
+    """
+    Record the version, build time and file hashes of a publish
+
+    The version is a hash of the files' contents, so republishing identical
+    data keeps the version (and every cache keyed on it).
+    """
+    data_dir = Path(data_dir)
+    entries = {}
+    for name in files:
+        stat = (data_dir / name).stat()
+        entries[name] = {'sha256': file_digest(data_dir / name), 'size': stat.st_size,
+                         'mtime_ns': stat.st_mtime_ns}
+
+    version = hashlib.sha256(''.join(f"{name}:{entry['sha256']}"
+                                     for name, entry in sorted(entries.items())).encode()).hexdigest()
+    manifest = {
+        'version': version[:16],
+        'built_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'rows': rows,
+        'files': entries,
+    }
+
+    path = data_dir / MANIFEST_FILE
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_manifest(data_dir=DATA_DIR):
+    """The manifest of the last publish, or None for data published without one"""
+    path = Path(data_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def manifest_drift(data_dir, manifest):
+    """
+    Published files that no longer match the manifest
+
+    A file whose size and modification time are unchanged is taken as is;
+    otherwise its hash decides, so a file that was only touched is not
+    reported.
+    """
+    data_dir = Path(data_dir)
+    drifted = []
+    for name, entry in manifest['files'].items():
+        path = data_dir / name
+        if not path.exists():
+            drifted.append(name)
+            continue
+        stat = path.stat()
+        if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']:
+            continue
+        if stat.st_size != entry['size'] or file_digest(path) != entry['sha256']:
+            drifted.append(name)
+    return drifted
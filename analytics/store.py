@@ -0,0 +1,129 @@
+"""
+Hot-reloadable handle on the published customer data.
+
+The dashboards keep one DatasetStore per process. Each rerun asks it for
+the current CustomerDataset; at most every CHECK_INTERVAL_S it compares
+the publish manifest (see analytics.snapshot) with the version it serves.
+When the notebook or the daily refresh has published a new version, the
+store loads and warms it on a background thread while reruns keep using
+the old one, then swaps it in under a lock: a rerun sees either the old
+or the new version, never a mix. Swap listeners evict the caches keyed on
+the old version; the old dataset and its own caches are released once
+the last rerun holding it finishes.
+
+A version whose CSV or statistics file does not match its manifest
+(rewritten on its own, or a publish still in progress) is not swapped in;
+the store keeps serving the previous version and reports the drift.
+"""
+
+import threading
+import time
+from pathlib import Path
+
+from analytics.dataset import CustomerDataset
+from analytics.snapshot import (CSV_FILE, DATA_DIR, DATABASE_FILE, MANIFEST_FILE, SNAPSHOT_FILE,
+                                STATS_FILE, manifest_drift, read_manifest)
+
+CHECK_INTERVAL_S = 5.0
+
+
+class DatasetStore:
+    """Current CustomerDataset of a data directory, reloaded when a new version is published"""
+
+    def __init__(self, data_dir=DATA_DIR, check_interval=CHECK_INTERVAL_S):
+        self.data_dir = Path(data_dir)
+        self.check_interval = check_interval
+        self.status = None
+        self.swaps = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._loader = None
+        self._last_check = time.monotonic()
+
+        self._marker = self._read_marker()
+        self._current = CustomerDataset(self.data_dir)
+        self._check_drift(self._current.manifest)
+
+    def on_swap(self, listener):
+        """Call listener(old_dataset, new_dataset) after each swap"""
+        self._listeners.append(listener)
+
+    def current(self):
+        """Dataset for this rerun; starts a background reload when a new version is published"""
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self.check()
+        return self._current
+
+    @property
+    def loading(self):
+        return self._loader is not None and self._loader.is_alive()
+
+    def _read_marker(self):
+        """Cheap change marker: size and modification time of every published file"""
+        marker = []
+        for name in (MANIFEST_FILE, CSV_FILE, STATS_FILE, SNAPSHOT_FILE, DATABASE_FILE):
+            path = self.data_dir / name
+            if path.exists():
+                stat = path.stat()
+                marker.append((name, stat.st_size, stat.st_mtime_ns))
+        return tuple(marker)
+
+    def _check_drift(self, manifest):
+        """Record whether the files still match a manifest; True when they do"""
+        drifted = manifest_drift(self.data_dir, manifest) if manifest is not None else []
+        if drifted:
+            self.status = (f"{', '.join(drifted)} changed without a new publish; "
+                           f"still serving version {self._current.version}")
+            return False
+        self.status = None
+        return True
+
+    def check(self):
+        """Start loading the published version if it differs from the current one"""
+        # Sessions rerun concurrently: one of them checks, the others move on
+        if not self._check_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._check()
+        finally:
+            self._check_lock.release()
+
+    def _check(self):
+        marker = self._read_marker()
+        if marker == self._marker or self.loading:
+            return False
+        self._marker = marker  # each state of the files is checked once
+
+        manifest = read_manifest(self.data_dir)
+        if manifest is not None:
+            if not self._check_drift(manifest):
+                return False
+            if manifest['version'] == self._current.version:
+                return False
+
+        self._loader = threading.Thread(target=self._reload, name="dataset-reload", daemon=True)
+        self._loader.start()
+        return True
+
+    def _reload(self):
+        try:
+            dataset = CustomerDataset(self.data_dir).warm(self._current)
+        except Exception as e:
+            self.status = f"Could not load the new data version: {e}"
+            return
+
+        with self._lock:
+            previous, self._current = self._current, dataset
+            self.swaps += 1
+        self.status = None
+        for listener in self._listeners:
+            listener(previous, dataset)
+
+    def wait(self, timeout=None):
+        """Block until a background reload (if any) has finished"""
+        loader = self._loader
+        if loader is not None:
+            loader.join(timeout)
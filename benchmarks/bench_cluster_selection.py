@@ -0,0 +1,49 @@
+"""
+Cluster-count sweep benchmark: wall time by number of worker processes
+
+Runs select_cluster_count on synthetic customers with one worker and with
+every core, and prints the timing breakdown of each run.
+
+Usage:
+python benchmarks/bench_cluster_selection.py --customers 1000000
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from analytics.cluster_selection import select_cluster_count  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=200_000)
+    parser.add_argument('--sample-size', type=int, default=5_000)
+    parser.add_argument('--samples', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({
+        'Recency': rng.integers(1, 400, args.customers),
+        'Frequency': rng.poisson(4, args.customers) + 1,
+        'Monetary': rng.exponential(800, args.customers),
+    })
+
+    for workers in sorted({1, os.cpu_count() or 1}):
+        selection = select_cluster_count(df, workers=workers, sample_size=args.sample_size,
+                                         n_samples=args.samples)
+        timings = selection['timings']
+        print(f"{workers} worker(s): {timings['wall_seconds']:.1f} s wall "
+              f"(fit {timings['fit_seconds']:.1f} s, silhouette {timings['silhouette_seconds']:.1f} s), "
+              f"chosen k={selection['chosen_k']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+CLV batch-scoring benchmark: BG/NBD + Gamma-Gamma fit and scoring time
+
+Generates synthetic customer histories and times the fit (on a sample),
+the compression of histories and the parallel scoring of every customer.
+
+Usage:
+python benchmarks/bench_clv.py --customers 10000000 --workers 8
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from analytics.clv import (clv_inputs, clv_tiers, compress_histories, fit_bgnbd,  # noqa: E402
+                           fit_gamma_gamma, predict_clv)
+
+
+def make_customers(n_customers, days=730, seed=42):
+    """Synthetic RFM frame with consistent Frequency, Recency and customer age"""
+    rng = np.random.default_rng(seed)
+    age = rng.integers(1, days, n_customers)
+    frequency = 1 + rng.poisson(3, n_customers)
+    last = (age * rng.random(n_customers)).astype('int64')
+    recency = np.where(frequency > 1, last, age)
+    return pd.DataFrame({
+        'Frequency': frequency,
+        'Days_Since_First': age,
+        'Recency': recency,
+        'Monetary': frequency * rng.gamma(2.0, 150.0, n_customers),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=2_000_000)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    df = make_customers(args.customers)
+    x, t_x, T, m = clv_inputs(df)
+
+    start = time.perf_counter()
+    bgnbd = fit_bgnbd(x, t_x, T)
+    gamma_gamma = fit_gamma_gamma(x, m)
+    fit_time = time.perf_counter() - start
+
+    _, triples, _ = compress_histories(x, t_x, T)
+
+    start = time.perf_counter()
+    clv = predict_clv(df, bgnbd, gamma_gamma, workers=args.workers)
+    clv_tiers(clv)
+    score_time = time.perf_counter() - start
+
+    print(f"Fit (sampled): {fit_time:.1f} s")
+    print(f"Scoring: {score_time:.1f} s for {args.customers:,} customers "
+          f"({len(triples):,} distinct histories, {args.customers / score_time:,.0f} customers/s)")
+
+
+if __name__ == "__main__":
+    main()
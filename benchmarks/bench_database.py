@@ -0,0 +1,137 @@
+"""
+Database backend benchmark: explorer queries and cube cells pushed down to SQLite
+
+Writes a synthetic frame of the explorer columns to a SQLite database and
+times random explorer selections against it: the match count, the first
+result page sorted by CLV and by Monetary (the latter ascending), and the
+GROUP BY behind the aggregate cube. Only the database file and the
+returned rows are held in memory.
+
+First checks that the database and the in-memory bitmap search return
+the same pages, including on columns with many ties (Frequency,
+Recency), so the explorer shows the same rows whichever backend serves
+it, and that the KPI cards of each selection (built from a cube of its
+matches) count the same customers as the explorer.
+
+Usage:
+python benchmarks/bench_database.py --rows 2000000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from analytics.bitmap import BitmapSearch  # noqa: E402
+from analytics.cube import AggregateCube  # noqa: E402
+from analytics.database import CustomerDatabase, write_database  # noqa: E402
+from analytics.dataset import CustomerDataset  # noqa: E402
+from analytics.kpi import KpiEngine  # noqa: E402
+from analytics.paging import DEFAULT_PAGE_SIZE  # noqa: E402
+from analytics.schema import CLV_SEGMENTS  # noqa: E402
+from analytics.snapshot import publish_snapshot  # noqa: E402
+from bench_explorer_filters import make_filter_columns, random_selection  # noqa: E402
+from bench_snapshot_load import make_customers  # noqa: E402
+
+COLUMNS = ['CustomerID', 'Segment', 'CLV_Segment', 'KMeans_Cluster', 'Monetary', 'CLV_Predictive']
+SORT_COLUMNS = ['CLV_Predictive', 'Monetary', 'Frequency', 'Recency', 'AOV', 'CustomerID']
+
+
+def check_backends(n_rows, queries=20):
+    """
+    Compare database and bitmap-search pages on the same published data
+
+    Returns:
+    Number of (selection, sort, page) combinations whose rows differ, plus
+    the selections whose KPI card count differs from the explorer's count
+    """
+    df = make_customers(n_rows)
+    rng = np.random.default_rng(3)
+    df['CLV_Predictive'] = (df['Monetary'] * rng.uniform(0.5, 3, n_rows)).astype('float32')
+    df['CLV_Segment'] = pd.Categorical.from_codes(rng.integers(0, len(CLV_SEGMENTS), n_rows), CLV_SEGMENTS)
+
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        publish_snapshot(df, tmp_dir, database=True)
+        data = CustomerDataset(tmp_dir)
+        backends = [data.search(), BitmapSearch(data.bitmap_index(), data)]
+        for _ in range(queries):
+            filters, ranges = random_selection(rng)
+            for backend in backends:
+                cards = KpiEngine(AggregateCube.from_search(backend, filters, ranges)).stats(filters)
+                mismatches += cards['total_customers'] != backend.count(filters, ranges)
+            for sort_column in SORT_COLUMNS:
+                for ascending in (False, True):
+                    start = int(rng.integers(0, 5)) * DEFAULT_PAGE_SIZE
+                    pages = [backend.page(['CustomerID'], filters, ranges, sort_column, ascending,
+                                          start, start + DEFAULT_PAGE_SIZE)['CustomerID'].tolist()
+                             for backend in backends]
+                    mismatches += pages[0] != pages[1]
+        data.database.close()
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--check-rows', type=int, default=20_000)
+    args = parser.parse_args()
+
+    mismatches = check_backends(args.check_rows)
+    print(f"Backend check on {args.check_rows:,} customers: {mismatches} differing pages or KPI counts")
+    if mismatches:
+        sys.exit(1)
+
+    print(f"Building {args.rows:,} synthetic customers...")
+    df = make_filter_columns(args.rows)
+    df.insert(0, 'CustomerID', np.arange(args.rows, dtype='int32'))
+    df['Monetary'] = np.random.default_rng(7).exponential(500, args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / 'customers.db'
+        start = time.perf_counter()
+        write_database(df, path)
+        print(f"Database written in {time.perf_counter() - start:.1f} s "
+              f"({path.stat().st_size / 1024**2:,.0f} MB)")
+        del df
+
+        database = CustomerDatabase(path)
+        rng = np.random.default_rng(0)
+        timings = {'Count': [], 'First page by CLV': [], 'First page by Monetary, ascending': []}
+        for _ in range(args.queries):
+            filters, ranges = random_selection(rng)
+
+            start = time.perf_counter()
+            database.count(filters, ranges)
+            timings['Count'].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            database.page(COLUMNS, filters, ranges, 'CLV_Predictive', False, 0, DEFAULT_PAGE_SIZE)
+            timings['First page by CLV'].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            database.page(COLUMNS, filters, ranges, 'Monetary', True, 0, DEFAULT_PAGE_SIZE)
+            timings['First page by Monetary, ascending'].append((time.perf_counter() - start) * 1000)
+
+        for label, values in timings.items():
+            values = np.array(values)
+            print(f"{label}: p50 {np.percentile(values, 50):.1f} ms | "
+                  f"p95 {np.percentile(values, 95):.1f} ms | max {values.max():.1f} ms")
+
+        start = time.perf_counter()
+        cells = database.cube_cells(['Customer_Segment', 'Cluster_Name', 'Cluster', 'CLV_Segment'],
+                                    ['Monetary', 'CLV_Predictive'])
+        print(f"Cube cells ({len(cells):,}): {time.perf_counter() - start:.2f} s")
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Explorer filter benchmark: bitmap-indexed segment, tier, cluster and CLV filters
+
+Builds the BitmapIndex over a synthetic frame of the explorer's filter
+columns and times random explorer selections (with and without a CLV
+range), including the popcount behind the "Showing N customers" line,
+and the fetch of the first result page sorted by CLV, both from the
+index's sorted order and by partial selection (the path for columns
+without one).
+
+Usage:
+python benchmarks/bench_explorer_filters.py --rows 20000000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from analytics.bitmap import BITMAP_COLUMNS, SORTED_COLUMNS, BitmapIndex  # noqa: E402
+from analytics.paging import DEFAULT_PAGE_SIZE, page_positions  # noqa: E402
+from analytics.schema import CLV_SEGMENTS  # noqa: E402
+from bench_snapshot_load import SEGMENTS  # noqa: E402
+
+TARGET_MS = 20
+
+
+def make_filter_columns(n_rows, seed=42):
+    """Only the indexed columns, so tens of millions of rows fit in memory"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Customer_Segment': pd.Categorical.from_codes(rng.integers(0, len(SEGMENTS), n_rows), SEGMENTS),
+        'Cluster_Name': pd.Categorical.from_codes(rng.integers(0, 4, n_rows), [f"Cluster {i}" for i in range(4)]),
+        'Cluster': rng.integers(0, 4, n_rows).astype('int8'),
+        'CLV_Segment': pd.Categorical.from_codes(rng.integers(0, len(CLV_SEGMENTS), n_rows), CLV_SEGMENTS),
+        'CLV_Predictive': rng.exponential(900, n_rows).astype('float32'),
+    })
+
+
+def random_selection(rng):
+    """A random explorer selection and, most of the time, a CLV range"""
+    filters = {
+        'Segment': list(rng.choice(SEGMENTS, rng.integers(1, len(SEGMENTS) + 1), replace=False)),
+        'CLV_Segment': list(rng.choice(CLV_SEGMENTS, rng.integers(1, len(CLV_SEGMENTS) + 1), replace=False)),
+        'KMeans_Cluster': list(rng.choice(4, rng.integers(1, 5), replace=False)),
+    }
+    ranges = None
+    if rng.random() < 0.7:
+        low = float(rng.integers(0, 1000))
+        ranges = {'CLV_Predictive': (low, low + float(rng.integers(100, 5000)))}
+    return filters, ranges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000_000)
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"Building {args.rows:,} synthetic customers...")
+    df = make_filter_columns(args.rows)
+
+    start = time.perf_counter()
+    index = BitmapIndex(df, BITMAP_COLUMNS, SORTED_COLUMNS)
+    print(f"Index built in {time.perf_counter() - start:.2f} s")
+    clv = df['CLV_Predictive'].to_numpy(dtype='float64')
+    del df
+
+    rng = np.random.default_rng(0)
+    timings = []
+    page_timings = []
+    select_timings = []
+    for _ in range(args.queries):
+        filters, ranges = random_selection(rng)
+        start = time.perf_counter()
+        bitmap = index.query(filters, ranges)
+        index.count(bitmap)
+        timings.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        low, high = (ranges or {}).get('CLV_Predictive', (None, None))
+        index.ordered_rows(bitmap, 'CLV_Predictive', 0, DEFAULT_PAGE_SIZE, low=low, high=high)
+        page_timings.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        rows = index.rows(bitmap)
+        page_positions(clv[rows], 0, DEFAULT_PAGE_SIZE)
+        select_timings.append((time.perf_counter() - start) * 1000)
+
+    timings = np.array(timings)
+    page_timings = np.array(page_timings)
+    select_timings = np.array(select_timings)
+    print(f"Explorer filters: p50 {np.percentile(timings, 50):.2f} ms | "
+          f"p95 {np.percentile(timings, 95):.2f} ms | max {timings.max():.2f} ms "
+          f"(target {TARGET_MS} ms)")
+    for label, page in [('sorted order', page_timings), ('partial selection', select_timings)]:
+        print(f"First page (top {DEFAULT_PAGE_SIZE} by CLV, {label}): p50 {np.percentile(page, 50):.2f} ms | "
+              f"p95 {np.percentile(page, 95):.2f} ms | max {page.max():.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Slice benchmark: KPI recomputation for cross-filter selections
+
+Builds the aggregate cube over a synthetic customer frame and times
+KpiEngine.stats() for random segment/cluster slices, the work done each
+time a user changes a dashboard filter.
+
+Usage:
+python benchmarks/bench_kpi_slices.py --rows 10000000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from analytics.cube import AggregateCube  # noqa: E402
+from analytics.kpi import KpiEngine  # noqa: E402
+from analytics.schema import apply_schema  # noqa: E402
+from bench_snapshot_load import CLUSTERS, SEGMENTS, make_customers  # noqa: E402
+
+TARGET_MS = 50
+
+
+def random_slice(rng):
+    """A random segment and/or cluster selection, like the dashboard slicers"""
+    filters = {}
+    if rng.random() < 0.8:
+        filters['Customer_Segment'] = list(rng.choice(SEGMENTS, rng.integers(1, 4), replace=False))
+    if rng.random() < 0.5:
+        filters['Cluster_Name'] = list(rng.choice(CLUSTERS, rng.integers(1, 3), replace=False))
+    return filters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--slices', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"Building {args.rows:,} synthetic customers...")
+    df, _ = apply_schema(make_customers(args.rows))
+
+    start = time.perf_counter()
+    cube = AggregateCube.build(df)
+    engine = KpiEngine(cube)
+    print(f"Cube: {len(cube.cells):,} cells built in {time.perf_counter() - start:.2f} s")
+    del df
+
+    rng = np.random.default_rng(0)
+    timings = []
+    for _ in range(args.slices):
+        filters = random_slice(rng)
+        start = time.perf_counter()
+        engine.stats(filters)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings = np.array(timings)
+    print(f"Slice KPIs: p50 {np.percentile(timings, 50):.2f} ms | "
+          f"p95 {np.percentile(timings, 95):.2f} ms | max {timings.max():.2f} ms "
+          f"(target {TARGET_MS} ms)")
+
+
+if __name__ == "__main__":
+    main()
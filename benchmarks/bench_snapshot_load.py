@@ -0,0 +1,106 @@
+"""
+Cold-load benchmark: CSV export vs memory-mapped Arrow snapshot
+
+Builds a synthetic customer frame with the dashboard columns, publishes it
+to a temporary data directory and times load_customer_data() in a fresh
+interpreter for each format.
+
+Usage:
+python benchmarks/bench_snapshot_load.py --rows 5000000
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from analytics.snapshot import CSV_FILE, SNAPSHOT_FILE, publish_snapshot  # noqa: E402
+
+SEGMENTS = ['Champions', 'Loyal Customers', 'Potential Loyalists', 'At Risk',
+            'Cannot Lose Them', 'Lost Customers']
+CLUSTERS = ['Regular Customers', 'VIP Customers', 'Occasional Customers', 'At-Risk Customers']
+
+LOAD_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+from analytics import snapshot
+if {force_csv}:
+    snapshot.snapshot_is_current = lambda data_dir: False
+start = time.perf_counter()
+df, stats = snapshot.load_customer_data({data_dir!r})
+print(time.perf_counter() - start)
+"""
+
+
+def make_customers(n_rows, seed=42):
+    """Synthetic customer frame with the same columns as the notebook export"""
+    rng = np.random.default_rng(seed)
+    recency = rng.integers(1, 366, n_rows)
+    frequency = rng.integers(1, 15, n_rows)
+    monetary = np.round(rng.exponential(450, n_rows) + 10, 2)
+    r, f, m = (rng.integers(1, 6, n_rows) for _ in range(3))
+
+    return pd.DataFrame({
+        'CustomerID': np.arange(10000, 10000 + n_rows, dtype=float),
+        'Recency': recency,
+        'Frequency': frequency,
+        'Monetary': monetary,
+        'AOV': monetary / frequency,
+        'Total_Quantity': rng.integers(1, 200, n_rows),
+        'Days_Since_First': recency + rng.integers(0, 300, n_rows),
+        'R_Score': r,
+        'F_Score': f,
+        'M_Score': m,
+        'RFM_Score': pd.Series(r).astype(str) + pd.Series(f).astype(str) + pd.Series(m).astype(str),
+        'RFM_Value': r + f + m,
+        'Customer_Segment': rng.choice(SEGMENTS, n_rows),
+        'Cluster': rng.integers(0, 4, n_rows),
+        'Cluster_Name': rng.choice(CLUSTERS, n_rows),
+        'Recency_Category': rng.choice(['Very_Recent', 'Recent', 'Moderate', 'Old'], n_rows),
+        'Frequency_Category': rng.choice(['Low', 'Medium', 'High'], n_rows),
+        'Monetary_Category': rng.choice(['Low_Value', 'Medium_Value', 'High_Value'], n_rows),
+        'Avg_Order_Value': monetary / frequency,
+        'Customer_Lifetime': frequency * 30 + recency,
+        'Purchase_Intensity': frequency / ((frequency * 30 + recency) / 365),
+    })
+
+
+def time_cold_load(data_dir, force_csv):
+    """Run one load in a fresh interpreter and return the elapsed seconds"""
+    script = LOAD_SCRIPT.format(root=str(ROOT), data_dir=str(data_dir), force_csv=force_csv)
+    result = subprocess.run([sys.executable, '-c', script], check=True,
+                            capture_output=True, text=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        print(f"Building {args.rows:,} synthetic customers...")
+        publish_snapshot(make_customers(args.rows), data_dir)
+
+        csv_mb = (Path(data_dir) / CSV_FILE).stat().st_size / 1024**2
+        snapshot_mb = (Path(data_dir) / SNAPSHOT_FILE).stat().st_size / 1024**2
+        print(f"CSV: {csv_mb:,.1f} MB | Snapshot: {snapshot_mb:,.1f} MB")
+
+        csv_time = min(time_cold_load(data_dir, True) for _ in range(args.repeat))
+        snapshot_time = min(time_cold_load(data_dir, False) for _ in range(args.repeat))
+
+    print(f"CSV cold load:      {csv_time:.3f} s")
+    print(f"Snapshot cold load: {snapshot_time:.3f} s")
+    print(f"Speedup:            {csv_time / snapshot_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
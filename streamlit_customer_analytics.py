@@ -24,10 +24,18 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
-import json
 import os
 from datetime import datetime
 
+from analytics.charts import adaptive_scatter, histogram_bar, histogram_figure
+from analytics.cluster_selection import load_cluster_selection
+from analytics.cube import AggregateCube
+from analytics.export import ExportJob, available_formats, prune_exports
+from analytics.figure_cache import FigureCache
+from analytics.kpi import KpiEngine
+from analytics.paging import DEFAULT_PAGE_SIZE, PAGE_SIZES, page_count
+from analytics.store import DatasetStore
+
 # Page configuration
 st.set_page_config(
     page_title="Customer Analytics Dashboard",
@@ -36,6 +44,19 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Columns each page reads; only these are loaded when the page is opened
+PAGE_COLUMNS = {
+    "Executive Summary": ['Customer_Segment', 'Monetary', 'CLV_Segment', 'Frequency'],
+    "RFM Analysis": ['Segment', 'R_Score', 'F_Score', 'M_Score', 'Recency', 'Frequency',
+                     'Monetary', 'CustomerID', 'CLV_Predictive'],
+    "CLV Analysis": ['CLV_Predictive', 'CLV_Segment', 'Monetary', 'Frequency', 'CustomerID', 'Segment'],
+    "K-Means Clustering": ['KMeans_Cluster', 'Monetary', 'CLV_Predictive', 'Frequency',
+                           'Recency', 'CustomerID'],
+    "Customer Explorer": ['CustomerID', 'Segment', 'CLV_Segment', 'KMeans_Cluster', 'Monetary',
+                          'CLV_Predictive', 'Frequency', 'Recency', 'AOV'],
+    "Recommendations": ['CLV_Segment', 'CLV_Predictive'],
+}
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -62,23 +83,68 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
+@st.cache_resource
+def load_store():
+    """Shared handle on the published data; new versions are swapped in as they are published"""
+    store = DatasetStore()
+    store.on_swap(lambda old, new: figure_cache().evict_version(old.version))
+    return store
+
 def load_data():
-    """Load customer analytics data"""
+    """Load customer data and statistics"""
     try:
-        # Load main dataset
-        data_path = '/Users/saivedanthava/Desktop/DA/customer-analytics-portfolio/data/customer_analytics_data.csv'
-        df = pd.read_csv(data_path)
-        
-        # Load statistics
-        stats_path = '/Users/saivedanthava/Desktop/DA/customer-analytics-portfolio/data/dashboard_stats.json'
-        with open(stats_path, 'r') as f:
-            stats = json.load(f)
-        
-        return df, stats
+        # Lazily loaded handle on the memory-mapped snapshot (CSV fallback),
+        # shared by every session; a newly published version is loaded in the
+        # background and served from the next rerun on.
+        return load_store().current()
     except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return None, None
+        st.error(f"Error loading data: {str(e)}")
+        return None
+
+@st.cache_resource
+def figure_cache():
+    """Built figures shared by every session, keyed by data version, chart and inputs"""
+    return FigureCache()
+
+def page_frame(data, columns, load=True):
+    """Load the columns a view needs (load=False: only check them), or explain which ones are missing"""
+    missing = data.missing(columns)
+    if missing:
+        st.warning(f"This view needs columns that are not in the dataset: {', '.join(missing)}")
+        return None
+    return data.frame(columns if load else [])
+
+def slice_frame(df, filters):
+    """Keep only the customers inside the selected slice"""
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in filters.items():
+        mask &= df[column].isin(values).to_numpy()
+    return df[mask]
+
+def create_slice_filters(engine):
+    """Sidebar cross-filter; the KPI cards and every page follow the slice"""
+    st.sidebar.header("Filters")
+    
+    segments = st.sidebar.multiselect(
+        "Customer Segments",
+        options=engine.labels('Customer_Segment'),
+        placeholder="All segments"
+    )
+    
+    clusters = st.sidebar.multiselect(
+        "Clusters",
+        options=engine.labels('Cluster_Name'),
+        placeholder="All clusters"
+    )
+    
+    filters = {}
+    if segments:
+        filters['Customer_Segment'] = segments
+    if clusters:
+        filters['Cluster_Name'] = clusters
+    return filters
 
 def create_metric_cards(stats):
     """Create KPI metric cards"""
@@ -107,44 +173,93 @@ def create_metric_cards(stats):
     
     with col4:
         # Find the segment with most customers
-        top_segment = max(stats['segment_distribution'], key=stats['segment_distribution'].get)
+        top_segment = max(stats['segment_distribution'], key=stats['segment_distribution'].get, default="-")
         st.metric(
             label="Top Segment",
             value=top_segment,
             help="Most valuable customer segment"
         )
 
-def create_rfm_analysis(df):
+@st.fragment
+def create_executive_summary(df, engine, filters=None):
+    """Executive summary: segment and revenue mix, key insights"""
+    st.markdown("## Executive Summary")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("### Customer Segmentation Overview")
+        segment_counts = engine.distribution('Customer_Segment', filters)
+        fig = px.pie(values=segment_counts.values, names=segment_counts.index, 
+                    title="Customer Value Distribution")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        st.markdown("### Revenue Distribution")
+        revenue_by_segment = engine.distribution('Customer_Segment', filters, measure='Monetary')
+        fig = px.bar(x=revenue_by_segment.index, y=revenue_by_segment.values,
+                    title="Total CLV by Segment")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # Key insights
+    st.markdown("### Key Insights")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        clv_counts = engine.distribution('CLV_Segment', filters)
+        diamond_pct = clv_counts.get('Diamond', 0) / max(clv_counts.sum(), 1) * 100
+        st.metric("Diamond Customers", f"{diamond_pct:.1f}%", "Top value tier")
+    
+    with col2:
+        repeat_customers = len(df[df['Frequency'] > 1]) / max(len(df), 1) * 100
+        st.metric("Repeat Customers", f"{repeat_customers:.1f}%", "Customer retention")
+    
+    with col3:
+        avg_frequency = df['Frequency'].mean()
+        st.metric("Avg Orders per Customer", f"{avg_frequency:.1f}", "Purchase frequency")
+
+@st.fragment
+def create_rfm_analysis(df, data, filters=None):
     """Create RFM analysis visualizations"""
     st.subheader("RFM Analysis")
     
+    # Figures are built once per data version and inputs, shared by every session
+    cache = figure_cache()
+    
     # RFM Distribution
     col1, col2 = st.columns(2)
     
     with col1:
         # RFM Segment Distribution
-        segment_counts = df['Segment'].value_counts()
-        fig_pie = px.pie(
-            values=segment_counts.values,
-            names=segment_counts.index,
-            title="RFM Customer Segments",
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
-        fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+        def build():
+            segment_counts = data.kpi_engine().distribution('Segment', filters)
+            fig_pie = px.pie(
+                values=segment_counts.values,
+                names=segment_counts.index,
+                title="RFM Customer Segments",
+                color_discrete_sequence=px.colors.qualitative.Set3
+            )
+            fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+            return fig_pie
+        fig_pie = cache.get(data.version, 'rfm_segment_pie', build, filters=filters)
         st.plotly_chart(fig_pie, use_container_width=True)
     
     with col2:
-        # RFM Scores Distribution
-        fig_hist = go.Figure()
-        fig_hist.add_trace(go.Histogram(x=df['R_Score'], name='Recency', opacity=0.7, bingroup=1))
-        fig_hist.add_trace(go.Histogram(x=df['F_Score'], name='Frequency', opacity=0.7, bingroup=1))
-        fig_hist.add_trace(go.Histogram(x=df['M_Score'], name='Monetary', opacity=0.7, bingroup=1))
-        fig_hist.update_layout(
-            title="RFM Scores Distribution",
-            xaxis_title="Score (1-5)",
-            yaxis_title="Number of Customers",
-            barmode='overlay'
-        )
+        # RFM Scores Distribution (one bin per score, binned server-side)
+        def build():
+            fig_hist = go.Figure()
+            for column, name in [('R_Score', 'Recency'), ('F_Score', 'Frequency'), ('M_Score', 'Monetary')]:
+                histogram = data.histogram(column, bins=5, range=(0.5, 5.5), filters=filters)
+                fig_hist.add_trace(histogram_bar(histogram, name=name, opacity=0.7))
+            fig_hist.update_layout(
+                title="RFM Scores Distribution",
+                xaxis_title="Score (1-5)",
+                yaxis_title="Number of Customers",
+                barmode='overlay'
+            )
+            return fig_hist
+        fig_hist = cache.get(data.version, 'rfm_score_histogram', build, filters=filters)
         st.plotly_chart(fig_hist, use_container_width=True)
     
     # RFM Scatter Plot
@@ -158,23 +273,34 @@ def create_rfm_analysis(df):
         y_axis = st.selectbox("Y-Axis", ['Recency', 'Frequency', 'Monetary'], index=1)
     
     if x_axis != y_axis:
-        fig_scatter = px.scatter(
-            df, 
-            x=x_axis, 
-            y=y_axis,
-            color='Segment',
-            size='Monetary',
-            hover_data=['CustomerID', 'CLV_Predictive'],
-            title=f"{x_axis} vs {y_axis} by Customer Segment",
-            color_discrete_sequence=px.colors.qualitative.Set1
-        )
-        fig_scatter.update_layout(height=500)
+        # WebGL points, a stratified sample or a density, depending on size
+        def build():
+            fig_scatter, note = adaptive_scatter(
+                df, 
+                x=x_axis, 
+                y=y_axis,
+                color='Segment',
+                size='Monetary',
+                hover_data=['CustomerID', 'CLV_Predictive'],
+                title=f"{x_axis} vs {y_axis} by Customer Segment",
+                color_discrete_sequence=px.colors.qualitative.Set1
+            )
+            fig_scatter.update_layout(height=500)
+            return fig_scatter, note
+        fig_scatter, note = cache.get(data.version, 'rfm_scatter', build, filters=filters,
+                                      x_axis=x_axis, y_axis=y_axis)
         st.plotly_chart(fig_scatter, use_container_width=True)
+        if note:
+            st.caption(note)
 
-def create_clv_analysis(df):
+@st.fragment
+def create_clv_analysis(df, data, filters=None):
     """Create CLV analysis visualizations"""
     st.subheader("Customer Lifetime Value Analysis")
     
+    # Figures are built once per data version and inputs, shared by every session
+    cache = figure_cache()
+    
     # CLV Overview
     col1, col2, col3 = st.columns(3)
     
@@ -192,76 +318,119 @@ def create_clv_analysis(df):
     
     # CLV Distribution and Segments
     col1, col2 = st.columns(2)
+    colors = {'Diamond': '#FFD700', 'Platinum': '#E5E4E2', 'Gold': '#FFD700', 
+              'Silver': '#C0C0C0', 'Bronze': '#CD7F32'}
     
     with col1:
-        # CLV Distribution
-        fig_hist_clv = px.histogram(
-            df, 
-            x='CLV_Predictive',
-            nbins=50,
-            title="CLV Distribution",
-            labels={'CLV_Predictive': 'Predicted CLV ($)', 'count': 'Number of Customers'}
-        )
-        fig_hist_clv.add_vline(
-            x=df['CLV_Predictive'].mean(), 
-            line_dash="dash", 
-            line_color="red",
-            annotation_text=f"Mean: ${df['CLV_Predictive'].mean():,.0f}"
-        )
+        # CLV Distribution (bins and mean line from one cached pass)
+        def build():
+            fig_hist_clv = histogram_figure(
+                data.histogram('CLV_Predictive', bins=50, filters=filters),
+                title="CLV Distribution",
+                x_title='Predicted CLV ($)',
+                mean_label="Mean: ${:,.0f}"
+            )
+            fig_hist_clv.update_layout(yaxis_title='Number of Customers')
+            return fig_hist_clv
+        fig_hist_clv = cache.get(data.version, 'clv_histogram', build, filters=filters)
         st.plotly_chart(fig_hist_clv, use_container_width=True)
     
     with col2:
         # CLV Segments
-        clv_segment_counts = df['CLV_Segment'].value_counts()
-        colors = {'Diamond': '#FFD700', 'Platinum': '#E5E4E2', 'Gold': '#FFD700', 
-                  'Silver': '#C0C0C0', 'Bronze': '#CD7F32'}
-        
-        fig_clv_pie = px.pie(
-            values=clv_segment_counts.values,
-            names=clv_segment_counts.index,
-            title="CLV Segment Distribution",
-            color=clv_segment_counts.index,
-            color_discrete_map=colors
-        )
+        def build():
+            clv_segment_counts = data.kpi_engine().distribution('CLV_Segment', filters)
+            return px.pie(
+                values=clv_segment_counts.values,
+                names=clv_segment_counts.index,
+                title="CLV Segment Distribution",
+                color=clv_segment_counts.index,
+                color_discrete_map=colors
+            )
+        fig_clv_pie = cache.get(data.version, 'clv_segment_pie', build, filters=filters)
         st.plotly_chart(fig_clv_pie, use_container_width=True)
     
     # CLV vs Historical Value
     st.subheader("Predicted vs Historical Value")
     
-    fig_scatter_clv = px.scatter(
-        df,
-        x='Monetary',
-        y='CLV_Predictive',
-        color='CLV_Segment',
-        size='Frequency',
-        hover_data=['CustomerID', 'Segment'],
-        title="Historical Spend vs Predicted CLV",
-        labels={'Monetary': 'Historical Spend ($)', 'CLV_Predictive': 'Predicted CLV ($)'},
-        color_discrete_map=colors
-    )
+    def build():
+        fig_scatter_clv, note = adaptive_scatter(
+            df,
+            x='Monetary',
+            y='CLV_Predictive',
+            color='CLV_Segment',
+            size='Frequency',
+            hover_data=['CustomerID', 'Segment'],
+            title="Historical Spend vs Predicted CLV",
+            labels={'Monetary': 'Historical Spend ($)', 'CLV_Predictive': 'Predicted CLV ($)'},
+            color_discrete_map=colors
+        )
+        
+        # Add perfect prediction line
+        max_val = max(df['Monetary'].max(), df['CLV_Predictive'].max())
+        fig_scatter_clv.add_shape(
+            type="line",
+            x0=0, y0=0, x1=max_val, y1=max_val,
+            line=dict(color="red", dash="dash"),
+        )
+        return fig_scatter_clv, note
+    fig_scatter_clv, note = cache.get(data.version, 'clv_scatter', build, filters=filters)
     
-    # Add perfect prediction line
-    max_val = max(df['Monetary'].max(), df['CLV_Predictive'].max())
-    fig_scatter_clv.add_shape(
-        type="line",
-        x0=0, y0=0, x1=max_val, y1=max_val,
-        line=dict(color="red", dash="dash"),
+    st.plotly_chart(fig_scatter_clv, use_container_width=True)
+    if note:
+        st.caption(note)
+
+def create_cluster_selection(selection):
+    """Show the elbow and silhouette curves behind the number of clusters"""
+    results = pd.DataFrame(selection['results']).set_index('k')
+    timings = selection['timings']
+    
+    st.markdown(
+        f"**{selection['chosen_k']} clusters** chosen: the smallest k whose silhouette interval overlaps "
+        f"the best one (k={selection['best_silhouette_k']}); the elbow of the inertia curve is at "
+        f"k={selection['elbow_k']}."
     )
     
-    st.plotly_chart(fig_scatter_clv, use_container_width=True)
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fig_elbow = px.line(
+            x=results.index, y=results['inertia'], markers=True,
+            title="Elbow: Inertia on All Customers",
+            labels={'x': 'Number of Clusters (k)', 'y': 'Inertia'}
+        )
+        fig_elbow.add_vline(x=selection['elbow_k'], line_dash="dash")
+        st.plotly_chart(fig_elbow, use_container_width=True)
+    
+    with col2:
+        fig_silhouette = go.Figure(go.Scatter(
+            x=results.index, y=results['silhouette'], mode='lines+markers',
+            error_y=dict(type='data', symmetric=False,
+                         array=results['silhouette_high'] - results['silhouette'],
+                         arrayminus=results['silhouette'] - results['silhouette_low'])
+        ))
+        fig_silhouette.add_vline(x=selection['chosen_k'], line_dash="dash")
+        fig_silhouette.update_layout(
+            title=f"Silhouette (95% CI over {selection['n_samples']} samples of {selection['sample_size']:,})",
+            xaxis_title="Number of Clusters (k)",
+            yaxis_title="Silhouette Score"
+        )
+        st.plotly_chart(fig_silhouette, use_container_width=True)
+    
+    st.caption(
+        f"Sweep over {selection['customers']:,} customers on {timings['workers']} workers: "
+        f"{timings['wall_seconds']:.1f}s wall time (fitting {timings['fit_seconds']:.1f}s, "
+        f"silhouette sampling {timings['silhouette_seconds']:.1f}s, scaling {timings['scale_seconds']:.2f}s)"
+    )
 
-def create_kmeans_analysis(df):
+@st.fragment
+def create_kmeans_analysis(df, cube, filters=None, selection=None):
     """Create K-Means clustering analysis"""
     st.subheader("K-Means Clustering Analysis")
     
-    # Cluster Overview
-    cluster_summary = df.groupby('KMeans_Cluster').agg({
-        'CustomerID': 'count',
-        'Monetary': 'mean',
-        'CLV_Predictive': 'mean',
-        'Frequency': 'mean',
-        'Recency': 'mean'
-    }).round(2)
+    # Cluster Overview (rolled up from the aggregate cube)
+    cluster_summary = cube.summary(
+        'KMeans_Cluster', means=['Monetary', 'CLV_Predictive', 'Frequency', 'Recency'], filters=filters
+    ).round(2)
     
     cluster_summary.columns = ['Count', 'Avg_Monetary', 'Avg_CLV', 'Avg_Frequency', 'Avg_Recency']
     cluster_summary['Percentage'] = (cluster_summary['Count'] / len(df) * 100).round(1)
@@ -273,7 +442,7 @@ def create_kmeans_analysis(df):
     
     with col1:
         # Cluster Distribution
-        cluster_counts = df['KMeans_Cluster'].value_counts().sort_index()
+        cluster_counts = cluster_summary['Count'].sort_index()
         fig_cluster_bar = px.bar(
             x=[f"Cluster {i}" for i in cluster_counts.index],
             y=cluster_counts.values,
@@ -292,51 +461,66 @@ def create_kmeans_analysis(df):
             labels={'KMeans_Cluster': 'Cluster', 'CLV_Predictive': 'Predicted CLV ($)'}
         )
         st.plotly_chart(fig_cluster_box, use_container_width=True)
+    
+    # Model selection recorded by the notebook
+    if selection is not None:
+        st.subheader("Choosing the Number of Clusters")
+        create_cluster_selection(selection)
 
-def create_customer_explorer(df):
-    """Create customer search and exploration tool"""
+def create_customer_explorer(data, filters=None):
+    """
+    Create customer search and exploration tool
+    
+    Filters, sorting and paging run in the data's search backend: the bitmap
+    index over the loaded columns (each selected value a precomputed bitmap,
+    the CLV range a run of the sorted CLV order, the match count a popcount),
+    or, when the publish included one, indexed queries on the SQLite
+    database. Results are paged server-side; only the current page is
+    fetched and sent to the browser.
+    
+    Returns:
+    (filters, ranges): the segment, CLV and cluster filters and the CLV
+    range picked by the user, so the KPI cards can follow the same selection
+    """
     st.subheader("Customer Explorer")
     
+    search = data.search()
+    
     # Search filters
     col1, col2, col3 = st.columns(3)
     
     with col1:
+        segments = search.values('Segment')
         segment_filter = st.multiselect(
             "RFM Segments",
-            options=df['Segment'].unique(),
-            default=df['Segment'].unique()[:3]
+            options=segments,
+            default=segments[:3]
         )
     
     with col2:
+        clv_segments = search.values('CLV_Segment')
         clv_segment_filter = st.multiselect(
             "CLV Segments",
-            options=df['CLV_Segment'].unique(),
-            default=df['CLV_Segment'].unique()[:3]
+            options=clv_segments,
+            default=clv_segments[:3]
         )
     
     with col3:
+        clusters = search.values('KMeans_Cluster')
         cluster_filter = st.multiselect(
             "K-Means Clusters",
-            options=sorted(df['KMeans_Cluster'].unique()),
-            default=sorted(df['KMeans_Cluster'].unique())[:3]
+            options=clusters,
+            default=clusters[:3]
         )
     
-    # Apply filters
-    filtered_df = df[
-        (df['Segment'].isin(segment_filter)) &
-        (df['CLV_Segment'].isin(clv_segment_filter)) &
-        (df['KMeans_Cluster'].isin(cluster_filter))
-    ]
-    
-    st.info(f"Showing {len(filtered_df):,} customers out of {len(df):,} total")
-    
     # CLV range filter
+    max_value = int(search.bounds('CLV_Predictive')[1])
     col1, col2 = st.columns(2)
     with col1:
         min_clv = st.number_input(
             "Minimum CLV ($)",
             min_value=0,
-            max_value=int(df['CLV_Predictive'].max()),
+            max_value=max_value,
             value=0
         )
     
@@ -344,41 +528,120 @@ def create_customer_explorer(df):
         max_clv = st.number_input(
             "Maximum CLV ($)",
             min_value=min_clv,
-            max_value=int(df['CLV_Predictive'].max()),
-            value=int(df['CLV_Predictive'].max())
+            max_value=max_value,
+            value=max_value
         )
     
-    # Apply CLV filter
-    filtered_df = filtered_df[
-        (filtered_df['CLV_Predictive'] >= min_clv) &
-        (filtered_df['CLV_Predictive'] <= max_clv)
-    ]
+    # Apply filters: sidebar slice AND explorer selections AND CLV range
+    explorer_filters = {
+        'Segment': segment_filter,
+        'CLV_Segment': clv_segment_filter,
+        'KMeans_Cluster': cluster_filter,
+    }
+    selection = {**(filters or {}), **explorer_filters}
+    ranges = {}
+    if min_clv > 0 or max_clv < max_value:
+        ranges['CLV_Predictive'] = (min_clv, max_clv)
+    
+    total = search.count(selection, ranges)
+    st.info(f"Showing {total:,} customers out of {search.count(filters):,} total")
     
-    # Display filtered customers
+    # Results (sorting, paging, export) rerun on their own
+    create_explorer_results(data, selection, ranges, total)
+    
+    return explorer_filters, ranges
+
+@st.fragment
+def create_explorer_results(data, selection, ranges, total):
+    """
+    Paged, sortable table and export of the customers in an explorer selection
+    
+    A fragment: sorting, paging and exporting rerun only this part, while
+    the explorer filters above it rerun the page so the KPI cards follow.
+    """
+    search = data.search()
+    
+    # Display filtered customers, one server-side page at a time
     display_columns = [
         'CustomerID', 'Segment', 'CLV_Segment', 'KMeans_Cluster',
         'Monetary', 'CLV_Predictive', 'Frequency', 'Recency', 'AOV'
     ]
+    sort_columns = ['CLV_Predictive', 'Monetary', 'Frequency', 'Recency', 'AOV', 'CustomerID']
+    
+    existing_display_cols = [col for col in display_columns if not data.missing([col])]
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sort_column = st.selectbox(
+            "Sort by",
+            options=[col for col in sort_columns if col in existing_display_cols]
+        )
+    
+    with col2:
+        ascending = st.radio("Order", ["Descending", "Ascending"], horizontal=True) == "Ascending"
+    
+    with col3:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
     
-    existing_display_cols = [col for col in display_columns if col in filtered_df.columns]
+    with col4:
+        n_pages = page_count(total, page_size)
+        page = st.number_input("Page", min_value=1, max_value=n_pages, value=1)
     
+    # Fetch only the page's rows (the only ones sent to the browser)
+    start = (page - 1) * page_size
     st.dataframe(
-        filtered_df[existing_display_cols].sort_values('CLV_Predictive', ascending=False),
+        search.page(existing_display_cols, selection, ranges, sort_column, ascending, start, start + page_size),
         use_container_width=True,
         height=400
     )
+    st.caption(f"Page {page:,} of {n_pages:,}, sorted by {sort_column} "
+               f"({'ascending' if ascending else 'descending'})")
     
-    # Download filtered data
-    if st.button("Download Filtered Data"):
-        csv = filtered_df.to_csv(index=False)
-        st.download_button(
-            label="Download CSV",
-            data=csv,
-            file_name=f"customer_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+    # Export the filtered customers in the page order: written chunk by chunk
+    # to a compressed temporary file, in the background when it is large
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox("Export format", available_formats())
+    
+    if st.button("Prepare Export"):
+        previous = st.session_state.pop('export_job', None)
+        if previous is not None:
+            previous.discard()
+        prune_exports()
+        st.session_state['export_job'] = ExportJob(
+            search.chunks(existing_display_cols, selection, ranges, sort_column, ascending),
+            total, export_format,
+            file_name=f"customer_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        ).start()
+    
+    if 'export_job' in st.session_state:
+        create_export_status(st.session_state['export_job'])
+
+def create_export_status(job):
+    """Progress of the session's export, then a download of the finished file"""
+    polling = not job.done
+    
+    # Only this fragment reruns while the export is written
+    @st.fragment(run_every=1.0 if polling else None)
+    def export_status():
+        if not job.done:
+            st.progress(job.progress, text=f"Exporting {job.total:,} customers: {job.written:,} written")
+        elif polling:
+            st.rerun()  # stop polling
+        elif job.error is not None:
+            st.error(f"Export failed: {job.error}")
+        else:
+            st.download_button(
+                label=f"Download {job.file_name} ({job.size_mb():,.1f} MB, {job.total:,} customers)",
+                data=job.open,  # read from the temporary file only when clicked
+                file_name=job.file_name,
+                mime=job.mime
+            )
+    
+    export_status()
 
-def create_business_recommendations(df):
+@st.fragment
+def create_business_recommendations(cube, filters=None):
     """Create business recommendations section"""
     st.subheader("Business Recommendations")
     
@@ -437,11 +700,14 @@ def create_business_recommendations(df):
     }
     
     # Display recommendations for each segment
+    clv_summary = cube.summary('CLV_Segment', means=['CLV_Predictive'], filters=filters)
+    total_customers = clv_summary['Count'].sum()
+    
     for segment, info in segments_info.items():
-        if segment in df['CLV_Segment'].unique():
-            segment_count = len(df[df['CLV_Segment'] == segment])
-            segment_pct = (segment_count / len(df)) * 100
-            avg_clv = df[df['CLV_Segment'] == segment]['CLV_Predictive'].mean()
+        if segment in clv_summary.index:
+            segment_count = int(clv_summary.loc[segment, 'Count'])
+            segment_pct = (segment_count / total_customers) * 100
+            avg_clv = clv_summary.loc[segment, 'Avg_CLV_Predictive']
             
             with st.expander(f"{info['icon']} {segment} Customers ({segment_count:,} customers, {segment_pct:.1f}%)"):
                 st.markdown(f"**Average CLV: ${avg_clv:,.0f}**")
@@ -456,78 +722,86 @@ def main():
     st.markdown("**Comprehensive insights into customer behavior, segmentation, and lifetime value**")
     
     # Load data
-    df, stats = load_data()
+    data = load_data()
     
-    if df is None or stats is None:
+    if data is None:
         st.error("Failed to load data. Please check the data files.")
         return
     
+    engine = data.kpi_engine()
+    
     # Sidebar
     st.sidebar.header("Navigation")
     
     # Main navigation
     page = st.sidebar.selectbox(
         "Choose Analysis",
-        ["Executive Summary", "RFM Analysis", "CLV Analysis", 
-         "K-Means Clustering", "Customer Explorer", "Recommendations"]
+        list(PAGE_COLUMNS)
     )
     
-    # Display KPI metrics at the top
+    filters = create_slice_filters(engine)
+    
+    # KPI metrics for the selected slice at the top; filled in after the page
+    # has rendered so they also follow the Customer Explorer filters
     st.markdown("## Key Performance Indicators")
-    create_metric_cards(stats)
+    kpi_container = st.container()
     st.markdown("---")
+    kpi_filters = dict(filters)
+    kpi_engine = engine
     
-    # Main content based on page selection
-    if page == "Executive Summary":
-        st.markdown("## Executive Summary")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown("### Customer Segmentation Overview")
-            segment_counts = df['Customer_Segment'].value_counts()
-            fig = px.pie(values=segment_counts.values, names=segment_counts.index, 
-                        title="Customer Value Distribution")
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            st.markdown("### Revenue Distribution")
-            revenue_by_segment = df.groupby('Customer_Segment')['Monetary'].sum().sort_values(ascending=False)
-            fig = px.bar(x=revenue_by_segment.index, y=revenue_by_segment.values,
-                        title="Total CLV by Segment")
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # Key insights
-        st.markdown("### Key Insights")
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            diamond_pct = len(df[df['CLV_Segment'] == 'Diamond']) / len(df) * 100
-            st.metric("Diamond Customers", f"{diamond_pct:.1f}%", "Top value tier")
-        
-        with col2:
-            repeat_customers = len(df[df['Frequency'] > 1]) / len(df) * 100
-            st.metric("Repeat Customers", f"{repeat_customers:.1f}%", "Customer retention")
-        
-        with col3:
-            avg_frequency = df['Frequency'].mean()
-            st.metric("Avg Orders per Customer", f"{avg_frequency:.1f}", "Purchase frequency")
+    # Load only the columns the selected page reads (plus the slice columns).
+    # The explorer queries data.search() instead of slicing loaded rows.
+    df = page_frame(data, PAGE_COLUMNS[page] + list(filters), load=page != "Customer Explorer")
+    if df is not None and page != "Customer Explorer":
+        df = slice_frame(df, filters)
+    
+    # Main content based on page selection: only the selected page runs, and
+    # each page body is a fragment, so its own widgets rerun just that page
+    if df is None:
+        pass  # page_frame has already listed the missing columns
+    
+    elif page == "Executive Summary":
+        create_executive_summary(df, engine, filters)
     
     elif page == "RFM Analysis":
-        create_rfm_analysis(df)
+        create_rfm_analysis(df, data, filters)
     
     elif page == "CLV Analysis":
-        create_clv_analysis(df)
+        create_clv_analysis(df, data, filters)
     
     elif page == "K-Means Clustering":
-        create_kmeans_analysis(df)
+        create_kmeans_analysis(df, data.cube(), filters, load_cluster_selection(data.data_dir))
     
     elif page == "Customer Explorer":
-        create_customer_explorer(df)
+        explorer_filters, ranges = create_customer_explorer(data, filters)
+        kpi_filters.update(explorer_filters)
+        if ranges:
+            # The cube has no CLV dimension: the cards of a CLV range come
+            # from a cube of just the matched customers
+            kpi_engine = KpiEngine(AggregateCube.from_search(data.search(), kpi_filters, ranges))
     
     elif page == "Recommendations":
-        create_business_recommendations(df)
+        create_business_recommendations(data.cube(), filters)
+    
+    with kpi_container:
+        create_metric_cards(kpi_engine.stats(kpi_filters))
+    
+    # Data version served, and files that drifted from its manifest
+    store = load_store()
+    if store.status:
+        st.sidebar.warning(store.status)
+    if data.manifest is not None:
+        st.sidebar.caption(f"Data version {data.version}, published {data.built_at}")
+    
+    # Memory of the columns loaded so far by this process
+    memory = data.memory_usage()
+    st.sidebar.caption(f"Loaded {len(data.loaded_columns)} of {len(data.available)} columns: "
+                       f"{memory['after_mb']:,.1f} MB ({memory['before_mb']:,.1f} MB before schema)")
+    
+    # Figure cache use across sessions
+    cache_stats = figure_cache().stats()
+    st.sidebar.caption(f"Figure cache: {cache_stats['entries']} figures, {cache_stats['mb']:,.1f} MB, "
+                       f"{cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses")
     
     # Footer
     st.markdown("---")
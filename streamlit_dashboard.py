@@ -2,9 +2,12 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import json
 import numpy as np
 
+from analytics.charts import adaptive_scatter, histogram_figure
+from analytics.figure_cache import FigureCache
+from analytics.store import DatasetStore
+
 # Page configuration
 st.set_page_config(
     page_title="Customer Analytics Dashboard",
@@ -13,6 +16,14 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Columns each tab reads; only these are loaded when the tab is built
+TAB_COLUMNS = {
+    'overview': ['Customer_Segment', 'Cluster_Name'],
+    'rfm': ['Recency', 'Frequency', 'Monetary'],
+    'segments': ['Customer_Segment', 'CustomerID', 'Recency', 'Frequency', 'Monetary'],
+    'clusters': ['Cluster_Name', 'CustomerID', 'Recency', 'Frequency', 'Monetary'],
+}
+
 # Custom CSS for dark theme and professional styling
 st.markdown("""
 <style>
@@ -109,21 +120,36 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
+@st.cache_resource
+def load_store():
+    """Shared handle on the published data; new versions are swapped in as they are published"""
+    store = DatasetStore()
+    store.on_swap(lambda old, new: figure_cache().evict_version(old.version))
+    return store
+
 def load_data():
     """Load customer data and statistics"""
     try:
-        # Load customer data
-        df = pd.read_csv('data/customer_analytics_data.csv')
-        
-        # Load statistics
-        with open('data/dashboard_stats.json', 'r') as f:
-            stats = json.load(f)
-        
-        return df, stats
+        # Lazily loaded handle on the memory-mapped snapshot (CSV fallback),
+        # shared by every session; a newly published version is loaded in the
+        # background and served from the next rerun on.
+        return load_store().current()
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
-        return None, None
+        return None
+
+@st.cache_resource
+def figure_cache():
+    """Built figures shared by every session, keyed by data version, chart and inputs"""
+    return FigureCache()
+
+def page_frame(data, columns, load=True):
+    """Load the columns a view needs (load=False: only check them), or explain which ones are missing"""
+    missing = data.missing(columns)
+    if missing:
+        st.warning(f"This view needs columns that are not in the dataset: {', '.join(missing)}")
+        return None
+    return data.frame(columns if load else [])
 
 def create_metric_card(title, value, format_type="number"):
     """Create a styled metric card"""
@@ -173,205 +199,253 @@ def create_donut_chart(values, labels, title, colors=None):
     
     return fig
 
-def main():
-    # Header
-    st.markdown("""
-    <div class="main-header">
-        <h1 class="dashboard-title">Customer Analytics Dashboard</h1>
-        <p class="dashboard-subtitle">Comprehensive RFM Analysis, Customer Segmentation & CLV Insights</p>
-    </div>
-    """, unsafe_allow_html=True)
+def apply_dark_theme(fig, x_title=None, y_title=None, height=400, legend=False):
+    """Dashboard styling shared by the bar, histogram and scatter charts"""
+    axis_title = dict(font=dict(color='#b8c5d1'))
+    fig.update_layout(
+        title=dict(font=dict(size=16, color='#00d4aa'), x=0.5),
+        xaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(axis_title, **({'text': x_title} if x_title else {}))),
+        yaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(axis_title, **({'text': y_title} if y_title else {}))),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        height=height
+    )
+    if legend:
+        fig.update_layout(legend=dict(font=dict(color='white')))
+    return fig
+
+def create_slice_filters(engine):
+    """Cross-filter widgets; the selected slice drives every KPI and chart"""
+    col1, col2 = st.columns(2)
     
-    # Load data
-    df, stats = load_data()
+    with col1:
+        segments = st.multiselect("Filter by Customer Segment", engine.labels('Customer_Segment'),
+                                  placeholder="All segments")
     
-    if df is None or stats is None:
-        st.error("Failed to load data. Please check your data files.")
-        return
+    with col2:
+        clusters = st.multiselect("Filter by Cluster", engine.labels('Cluster_Name'),
+                                  placeholder="All clusters")
+    
+    filters = {}
+    if segments:
+        filters['Customer_Segment'] = segments
+    if clusters:
+        filters['Cluster_Name'] = clusters
+    return filters
+
+def slice_frame(df, filters):
+    """Keep only the customers inside the selected slice"""
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in filters.items():
+        mask &= df[column].isin(values).to_numpy()
+    return df[mask]
+
+@st.fragment
+def create_overview_tab(engine, filters, version):
+    """Overview tab: KPI cards and distribution donuts"""
+    st.markdown('<p class="section-header">Key Performance Indicators</p>', unsafe_allow_html=True)
+    
+    # KPIs for the selected slice, merged from the cube's cell aggregates
+    stats = engine.stats(filters)
+    
+    # KPI Cards
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.markdown(create_metric_card("Total Customers", stats['total_customers']), unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown(create_metric_card("Total Revenue", stats['total_revenue'], "currency"), unsafe_allow_html=True)
     
-    # Navigation tabs
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "🔍 RFM Analysis", "👥 Customer Segments", "🎯 Cluster Analysis"])
-    
-    with tab1:
-        st.markdown('<p class="section-header">Key Performance Indicators</p>', unsafe_allow_html=True)
-        
-        # KPI Cards
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.markdown(create_metric_card("Total Customers", stats['total_customers']), unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(create_metric_card("Total Revenue", stats['total_revenue'], "currency"), unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown(create_metric_card("Avg Revenue/Customer", stats['avg_monetary'], "currency"), unsafe_allow_html=True)
-        
-        with col4:
-            top_segment = max(stats['segment_distribution'], key=stats['segment_distribution'].get)
-            st.markdown(create_metric_card("Top Segment", top_segment, "text"), unsafe_allow_html=True)
-        
-        st.markdown("---")
-        
-        # Charts
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            segment_counts = df['Customer_Segment'].value_counts()
-            fig = create_donut_chart(
+    with col3:
+        st.markdown(create_metric_card("Avg Revenue/Customer", stats['avg_monetary'], "currency"), unsafe_allow_html=True)
+    
+    with col4:
+        top_segment = max(stats['segment_distribution'], key=stats['segment_distribution'].get, default="-")
+        st.markdown(create_metric_card("Top Segment", top_segment, "text"), unsafe_allow_html=True)
+    
+    st.markdown("---")
+    
+    # Charts (built once per data version and slice, shared by every session)
+    cache = figure_cache()
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        def build():
+            segment_counts = engine.distribution('Customer_Segment', filters)
+            return create_donut_chart(
                 segment_counts.values, 
                 segment_counts.index, 
                 "Customer Segment Distribution"
             )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            cluster_counts = df['Cluster_Name'].value_counts()
-            fig = create_donut_chart(
+        fig = cache.get(version, 'segment_donut', build, filters=filters)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        def build():
+            cluster_counts = engine.distribution('Cluster_Name', filters)
+            return create_donut_chart(
                 cluster_counts.values, 
                 cluster_counts.index, 
                 "Cluster Distribution",
                 colors=['#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4']
             )
-            st.plotly_chart(fig, use_container_width=True)
+        fig = cache.get(version, 'cluster_donut', build, filters=filters)
+        st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def create_rfm_tab(data, filters):
+    """RFM Analysis tab: Recency, Frequency and Monetary histograms (binned server-side)"""
+    st.markdown('<p class="section-header">RFM Analysis Distribution</p>', unsafe_allow_html=True)
     
-    with tab2:
-        st.markdown('<p class="section-header">RFM Analysis Distribution</p>', unsafe_allow_html=True)
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            fig = px.histogram(
-                df, x='Recency', 
-                title='Recency Distribution',
-                nbins=30,
-                color_discrete_sequence=['#00d4aa']
-            )
-            fig.update_layout(
-                title=dict(font=dict(size=16, color='#00d4aa'), x=0.5),
-                xaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(text='Days Since Last Purchase', font=dict(color='#b8c5d1'))),
-                yaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(font=dict(color='#b8c5d1'))),
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                height=400
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            fig = px.histogram(
-                df, x='Frequency', 
-                title='Frequency Distribution',
-                nbins=30,
-                color_discrete_sequence=['#2a5298']
-            )
-            fig.update_layout(
-                title=dict(font=dict(size=16, color='#00d4aa'), x=0.5),
-                xaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(text='Number of Purchases', font=dict(color='#b8c5d1'))),
-                yaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(font=dict(color='#b8c5d1'))),
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                height=400
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col3:
-            fig = px.histogram(
-                df, x='Monetary', 
-                title='Monetary Distribution',
-                nbins=30,
-                color_discrete_sequence=['#ff6b6b']
-            )
-            fig.update_layout(
-                title=dict(font=dict(size=16, color='#00d4aa'), x=0.5),
-                xaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(text='Total Spent ($)', font=dict(color='#b8c5d1'))),
-                yaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(font=dict(color='#b8c5d1'))),
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                height=400
-            )
+    cache = figure_cache()
+    histograms = [
+        ('Recency', 'Recency Distribution', '#00d4aa', 'Days Since Last Purchase'),
+        ('Frequency', 'Frequency Distribution', '#2a5298', 'Number of Purchases'),
+        ('Monetary', 'Monetary Distribution', '#ff6b6b', 'Total Spent ($)'),
+    ]
+    
+    for col, (column, title, color, x_title) in zip(st.columns(3), histograms):
+        with col:
+            def build():
+                fig = histogram_figure(data.histogram(column, bins=30, filters=filters), title=title, color=color)
+                return apply_dark_theme(fig, x_title=x_title)
+            fig = cache.get(data.version, f'{column.lower()}_histogram', build, filters=filters)
             st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def create_segments_tab(cube, filters, version):
+    """Customer Segments tab: segment statistics and comparison bars"""
+    st.markdown('<p class="section-header">Customer Segment Analysis</p>', unsafe_allow_html=True)
     
-    with tab3:
-        st.markdown('<p class="section-header">Customer Segment Analysis</p>', unsafe_allow_html=True)
-        
-        # Segment statistics
-        segment_stats = df.groupby('Customer_Segment').agg({
-            'CustomerID': 'count',
-            'Recency': 'mean',
-            'Frequency': 'mean',
-            'Monetary': 'mean'
-        }).round(2)
-        segment_stats.columns = ['Count', 'Avg_Recency', 'Avg_Frequency', 'Avg_Monetary']
-        
-        st.dataframe(segment_stats, use_container_width=True)
-        
-        # Segment comparison charts
-        col1, col2 = st.columns(2)
-        
-        with col1:
+    # Segment statistics (rolled up from the aggregate cube)
+    segment_stats = cube.summary('Customer_Segment', means=['Recency', 'Frequency', 'Monetary'],
+                                 filters=filters).round(2)
+    
+    st.dataframe(segment_stats, use_container_width=True)
+    
+    # Segment comparison charts
+    cache = figure_cache()
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        def build():
             fig = px.bar(
                 x=segment_stats.index, 
                 y=segment_stats['Count'], 
                 title="Customers by Segment",
                 color_discrete_sequence=['#00d4aa']
             )
-            fig.update_layout(
-                title=dict(font=dict(size=16, color='#00d4aa'), x=0.5),
-                xaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(font=dict(color='#b8c5d1'))),
-                yaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(font=dict(color='#b8c5d1'))),
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                height=400
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
+            return apply_dark_theme(fig)
+        fig = cache.get(version, 'segment_count_bar', build, filters=filters)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        def build():
             fig = px.bar(
                 x=segment_stats.index, 
                 y=segment_stats['Avg_Monetary'], 
                 title="Average Revenue by Segment",
                 color_discrete_sequence=['#2a5298']
             )
-            fig.update_layout(
-                title=dict(font=dict(size=16, color='#00d4aa'), x=0.5),
-                xaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(font=dict(color='#b8c5d1'))),
-                yaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(font=dict(color='#b8c5d1'))),
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                height=400
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            return apply_dark_theme(fig)
+        fig = cache.get(version, 'segment_revenue_bar', build, filters=filters)
+        st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def create_clusters_tab(df, cube, filters, version):
+    """Cluster Analysis tab: cluster statistics and scatter plot"""
+    st.markdown('<p class="section-header">K-Means Cluster Analysis</p>', unsafe_allow_html=True)
+    
+    # Cluster statistics (rolled up from the aggregate cube)
+    cluster_stats = cube.summary('Cluster_Name', means=['Recency', 'Frequency', 'Monetary'],
+                                 filters=filters).round(2)
     
-    with tab4:
-        st.markdown('<p class="section-header">K-Means Cluster Analysis</p>', unsafe_allow_html=True)
-        
-        # Cluster statistics
-        cluster_stats = df.groupby('Cluster_Name').agg({
-            'CustomerID': 'count',
-            'Recency': 'mean',
-            'Frequency': 'mean',
-            'Monetary': 'mean'
-        }).round(2)
-        cluster_stats.columns = ['Count', 'Avg_Recency', 'Avg_Frequency', 'Avg_Monetary']
-        
-        st.dataframe(cluster_stats, use_container_width=True)
-        
-        # Scatter plot
-        fig = px.scatter(
+    st.dataframe(cluster_stats, use_container_width=True)
+    
+    # Scatter plot (WebGL points, a stratified sample or a density, depending on size)
+    def build():
+        fig, note = adaptive_scatter(
             df, x='Recency', y='Monetary', color='Cluster_Name',
             title="Customer Clusters: Recency vs Monetary Value",
             color_discrete_sequence=['#00d4aa', '#2a5298', '#ff6b6b', '#4ecdc4']
         )
-        fig.update_layout(
-            title=dict(font=dict(size=16, color='#00d4aa'), x=0.5),
-            xaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(text='Days Since Last Purchase', font=dict(color='#b8c5d1'))),
-            yaxis=dict(color='white', gridcolor='#3a4a5c', title=dict(text='Total Spent ($)', font=dict(color='#b8c5d1'))),
-            legend=dict(font=dict(color='white')),
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            height=450
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        return apply_dark_theme(fig, x_title='Days Since Last Purchase', y_title='Total Spent ($)',
+                                height=450, legend=True), note
+    fig, note = figure_cache().get(version, 'cluster_scatter', build, filters=filters)
+    st.plotly_chart(fig, use_container_width=True)
+    if note:
+        st.caption(note)
+
+def main():
+    # Header
+    st.markdown("""
+    <div class="main-header">
+        <h1 class="dashboard-title">Customer Analytics Dashboard</h1>
+        <p class="dashboard-subtitle">Comprehensive RFM Analysis, Customer Segmentation & CLV Insights</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Load data
+    data = load_data()
+    
+    if data is None:
+        st.error("Failed to load data. Please check your data files.")
+        return
+    
+    # Cross-filter slice shared by all tabs
+    filters = create_slice_filters(data.kpi_engine())
+    
+    # Navigation tabs: switching tabs reruns the app, and only the open tab
+    # is built. Each tab body is a fragment, so interacting inside one
+    # reruns just that tab.
+    tab1, tab2, tab3, tab4 = st.tabs(
+        ["📊 Overview", "🔍 RFM Analysis", "👥 Customer Segments", "🎯 Cluster Analysis"],
+        key="dashboard_tab",
+        on_change="rerun"
+    )
+    
+    # Overview, RFM and Segments render from the KPI engine, the cube and
+    # cached histograms: only check their columns, without loading them
+    if tab1.open:
+        with tab1:
+            if page_frame(data, TAB_COLUMNS['overview'], load=False) is not None:
+                create_overview_tab(data.kpi_engine(), filters, data.version)
+    
+    if tab2.open:
+        with tab2:
+            if page_frame(data, TAB_COLUMNS['rfm'] + list(filters), load=False) is not None:
+                create_rfm_tab(data, filters)
+    
+    if tab3.open:
+        with tab3:
+            if page_frame(data, TAB_COLUMNS['segments'], load=False) is not None:
+                create_segments_tab(data.cube(), filters, data.version)
+    
+    if tab4.open:
+        with tab4:
+            df = page_frame(data, TAB_COLUMNS['clusters'] + list(filters))
+            if df is not None:
+                create_clusters_tab(slice_frame(df, filters), data.cube(), filters, data.version)
+    
+    # Data version served, and files that drifted from its manifest
+    store = load_store()
+    if store.status:
+        st.sidebar.warning(store.status)
+    if data.manifest is not None:
+        st.sidebar.caption(f"Data version {data.version}, published {data.built_at}")
+    
+    # Memory of the columns loaded so far by this process
+    memory = data.memory_usage()
+    st.sidebar.caption(f"Loaded {len(data.loaded_columns)} of {len(data.available)} columns: "
+                       f"{memory['after_mb']:,.1f} MB ({memory['before_mb']:,.1f} MB before schema)")
+    
+    # Figure cache use across sessions
+    cache_stats = figure_cache().stats()
+    st.sidebar.caption(f"Figure cache: {cache_stats['entries']} figures, {cache_stats['mb']:,.1f} MB, "
+                       f"{cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses")
     
     # Footer
     st.markdown("---")
@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import json
+
+from analytics.charts import adaptive_scatter, histogram_figure
+from analytics.store import DatasetStore
 
 # Page configuration
 st.set_page_config(
@@ -12,70 +15,66 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-@st.cache_data
+# Columns each page reads; only these are loaded when the page is opened
+PAGE_COLUMNS = {
+    "Overview": ['Customer_Segment', 'Cluster_Name'],
+    "RFM Analysis": ['Recency', 'Frequency', 'Monetary'],
+    "Customer Segments": ['Customer_Segment', 'CustomerID', 'Recency', 'Frequency', 'Monetary'],
+    "Cluster Analysis": ['Cluster_Name', 'CustomerID', 'Recency', 'Frequency', 'Monetary'],
+}
+
+@st.cache_resource
+def load_store():
+    """Shared handle on the published data; new versions are swapped in as they are published"""
+    return DatasetStore()
+
 def load_data():
     """Load customer data and statistics"""
     try:
-        # Load customer data
-        df = pd.read_csv('data/customer_analytics_data.csv')
-        
-        # Load statistics
-        with open('data/dashboard_stats.json', 'r') as f:
-            stats = json.load(f)
-        
-        return df, stats
+        # Lazily loaded handle on the memory-mapped snapshot (CSV fallback),
+        # shared by every session; a newly published version is loaded in the
+        # background and served from the next rerun on.
+        return load_store().current()
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
-        return None, None
+        return None
 
-def main():
-    st.title("🎯 Customer Analytics Dashboard")
-    st.markdown("### Comprehensive RFM Analysis, Customer Segmentation & CLV Insights")
-    
-    # Load data
-    df, stats = load_data()
-    
-    if df is None or stats is None:
-        st.error("Failed to load data. Please check your data files.")
-        return
-    
-    # Sidebar
-    st.sidebar.header("Navigation")
-    page = st.sidebar.selectbox("Choose Analysis", 
-                               ["Overview", "RFM Analysis", "Customer Segments", "Cluster Analysis"])
-    
-    # KPI Metrics
-    st.markdown("## Key Performance Indicators")
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric("Total Customers", f"{stats['total_customers']:,}")
-    
-    with col2:
-        st.metric("Total Revenue", f"${stats['total_revenue']:,.2f}")
-    
-    with col3:
-        st.metric("Avg Revenue/Customer", f"${stats['avg_monetary']:,.0f}")
-    
-    with col4:
-        top_segment = max(stats['segment_distribution'], key=stats['segment_distribution'].get)
-        st.metric("Top Segment", top_segment)
-    
-    st.markdown("---")
+def page_frame(data, columns):
+    """Load the columns a view needs, or explain which ones are missing"""
+    missing = data.missing(columns)
+    if missing:
+        st.warning(f"This view needs columns that are not in the dataset: {', '.join(missing)}")
+        return None
+    return data.frame(columns)
+
+def slice_frame(df, filters):
+    """Keep only the customers inside the selected slice"""
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in filters.items():
+        mask &= df[column].isin(values).to_numpy()
+    return df[mask]
+
+@st.fragment
+def render_page(page, df, data, engine, filters):
+    """Body of the selected page; a fragment, so it reruns on its own"""
+    if df is None:
+        pass  # page_frame has already listed the missing columns
     
-    if page == "Overview":
+    elif page == "Overview":
         col1, col2 = st.columns(2)
         
         with col1:
             st.markdown("### Customer Segment Distribution")
-            segment_counts = df['Customer_Segment'].value_counts()
+            segment_counts = engine.distribution('Customer_Segment', filters)
             fig = px.pie(values=segment_counts.values, names=segment_counts.index, 
                         title="RFM Customer Segments")
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
             st.markdown("### Cluster Distribution")
-            cluster_counts = df['Cluster_Name'].value_counts()
+            cluster_counts = engine.distribution('Cluster_Name', filters)
             fig = px.pie(values=cluster_counts.values, names=cluster_counts.index, 
                         title="K-Means Clusters")
             st.plotly_chart(fig, use_container_width=True)
@@ -83,34 +82,30 @@ def main():
     elif page == "RFM Analysis":
         st.markdown("### RFM Analysis")
         
+        # Histograms binned server-side and cached per data version and slice
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            fig = px.histogram(df, x='Recency', title='Recency Distribution', 
-                             labels={'Recency': 'Days Since Last Purchase'})
+            fig = histogram_figure(data.histogram('Recency', bins=30, filters=filters),
+                                   title='Recency Distribution', x_title='Days Since Last Purchase')
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            fig = px.histogram(df, x='Frequency', title='Frequency Distribution',
-                             labels={'Frequency': 'Number of Purchases'})
+            fig = histogram_figure(data.histogram('Frequency', bins=30, filters=filters),
+                                   title='Frequency Distribution', x_title='Number of Purchases')
             st.plotly_chart(fig, use_container_width=True)
         
         with col3:
-            fig = px.histogram(df, x='Monetary', title='Monetary Distribution',
-                             labels={'Monetary': 'Total Spent ($)'})
+            fig = histogram_figure(data.histogram('Monetary', bins=30, filters=filters),
+                                   title='Monetary Distribution', x_title='Total Spent ($)')
             st.plotly_chart(fig, use_container_width=True)
     
     elif page == "Customer Segments":
         st.markdown("### Customer Segment Analysis")
         
-        # Segment statistics
-        segment_stats = df.groupby('Customer_Segment').agg({
-            'CustomerID': 'count',
-            'Recency': 'mean',
-            'Frequency': 'mean',
-            'Monetary': 'mean'
-        }).round(2)
-        segment_stats.columns = ['Count', 'Avg_Recency', 'Avg_Frequency', 'Avg_Monetary']
+        # Segment statistics (rolled up from the aggregate cube)
+        segment_stats = data.cube().summary('Customer_Segment', means=['Recency', 'Frequency', 'Monetary'],
+                                            filters=filters).round(2)
         
         st.dataframe(segment_stats, use_container_width=True)
         
@@ -130,22 +125,91 @@ def main():
     elif page == "Cluster Analysis":
         st.markdown("### K-Means Cluster Analysis")
         
-        # Cluster statistics
-        cluster_stats = df.groupby('Cluster_Name').agg({
-            'CustomerID': 'count',
-            'Recency': 'mean',
-            'Frequency': 'mean',
-            'Monetary': 'mean'
-        }).round(2)
-        cluster_stats.columns = ['Count', 'Avg_Recency', 'Avg_Frequency', 'Avg_Monetary']
+        # Cluster statistics (rolled up from the aggregate cube)
+        cluster_stats = data.cube().summary('Cluster_Name', means=['Recency', 'Frequency', 'Monetary'],
+                                            filters=filters).round(2)
         
         st.dataframe(cluster_stats, use_container_width=True)
         
-        # Scatter plot
-        fig = px.scatter(df, x='Recency', y='Monetary', color='Cluster_Name',
-                        title="Customer Clusters: Recency vs Monetary",
-                        labels={'Recency': 'Days Since Last Purchase', 'Monetary': 'Total Spent ($)'})
+        # Scatter plot (WebGL points, a stratified sample or a density, depending on size)
+        fig, note = adaptive_scatter(df, x='Recency', y='Monetary', color='Cluster_Name',
+                                     title="Customer Clusters: Recency vs Monetary",
+                                     labels={'Recency': 'Days Since Last Purchase', 'Monetary': 'Total Spent ($)'})
         st.plotly_chart(fig, use_container_width=True)
+        if note:
+            st.caption(note)
+
+def main():
+    st.title("🎯 Customer Analytics Dashboard")
+    st.markdown("### Comprehensive RFM Analysis, Customer Segmentation & CLV Insights")
+    
+    # Load data
+    data = load_data()
+    
+    if data is None:
+        st.error("Failed to load data. Please check your data files.")
+        return
+    
+    engine = data.kpi_engine()
+    
+    # Sidebar
+    st.sidebar.header("Navigation")
+    page = st.sidebar.selectbox("Choose Analysis", list(PAGE_COLUMNS))
+    
+    # Cross-filter slice: KPIs and every chart below follow it
+    st.sidebar.header("Filters")
+    segments = st.sidebar.multiselect("Customer Segments", engine.labels('Customer_Segment'),
+                                      placeholder="All segments")
+    clusters = st.sidebar.multiselect("Clusters", engine.labels('Cluster_Name'),
+                                      placeholder="All clusters")
+    
+    filters = {}
+    if segments:
+        filters['Customer_Segment'] = segments
+    if clusters:
+        filters['Cluster_Name'] = clusters
+    
+    stats = engine.stats(filters)
+    
+    # KPI Metrics
+    st.markdown("## Key Performance Indicators")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Total Customers", f"{stats['total_customers']:,}")
+    
+    with col2:
+        st.metric("Total Revenue", f"${stats['total_revenue']:,.2f}")
+    
+    with col3:
+        st.metric("Avg Revenue/Customer", f"${stats['avg_monetary']:,.0f}")
+    
+    with col4:
+        top_segment = max(stats['segment_distribution'], key=stats['segment_distribution'].get, default="-")
+        st.metric("Top Segment", top_segment)
+    
+    st.markdown("---")
+    
+    # Load only the columns the selected page reads
+    df = page_frame(data, PAGE_COLUMNS[page] + list(filters))
+    
+    if df is not None:
+        df = slice_frame(df, filters)
+    
+    # Only the selected page runs, as a fragment of its own
+    render_page(page, df, data, engine, filters)
+    
+    # Data version served, and files that drifted from its manifest
+    store = load_store()
+    if store.status:
+        st.sidebar.warning(store.status)
+    if data.manifest is not None:
+        st.sidebar.caption(f"Data version {data.version}, published {data.built_at}")
+    
+    # Memory of the columns loaded so far by this process
+    memory = data.memory_usage()
+    st.sidebar.caption(f"Loaded {len(data.loaded_columns)} of {len(data.available)} columns: "
+                       f"{memory['after_mb']:,.1f} MB ({memory['before_mb']:,.1f} MB before schema)")
     
     # Footer
     st.markdown("---")